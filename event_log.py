@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+Indexed, memory-mapped reader for the room event log (data/events.jsonl).
+
+Answering "events after T" from a JSONL file normally means parsing it
+from the top. EventLog keeps a sparse index next to every segment
+(<segment>.idx): one mark per INDEX_STRIDE bytes holding the byte offset
+of a line and the highest timestamp of all lines before it. That running
+maximum never decreases, so a binary search finds the offset from which
+every event with timestamp >= T follows, even when timestamps are not
+strictly in order. Reads mmap the segment, jump to that mark and parse
+lazily; worldType/agentId filters are checked on the raw bytes before a
+line is parsed.
+
+The log is the active file (data/events.jsonl) plus sealed segments next
+to it, named by the range of rotations they hold:
+
+  data/events.000001-000001.jsonl    rotated out first
+  data/events.000002-000005.jsonl    rotations 2..5, compacted into one
+  data/events.jsonl                  active, appended to
+
+rotate() seals the active file; compact() merges small sealed segments
+(and drops events older than a cutoff). A merged segment is written under
+its new range name before its sources are removed, so after a crash the
+leftover sources are covered by a wider range and skipped.
+
+The active file's index is extended incrementally as the file grows. The
+server's EventStore rewrites events.jsonl in place on every flush; a
+rewritten file no longer matches the index fingerprint (size and the
+CRC of its first bytes) and is re-indexed. Rotate only while the server
+is stopped, or for logs written through EventLog.append().
+
+Usage: python3 event_log.py query [--since MS] [--until MS] [--type chat] [--agent ID] [--log PATH]
+       python3 event_log.py stats [--log PATH]
+       python3 event_log.py rotate [--log PATH]
+       python3 event_log.py compact [--before MS] [--target-mb 64] [--log PATH]
+       python3 event_log.py bench [--count 1000000]
+"""
+import argparse
+import bisect
+import json
+import mmap
+import os
+import re
+import sys
+import time
+import zlib
+
+EVENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "events.jsonl")
+INDEX_STRIDE = 64 * 1024  # bytes between index marks
+ROTATE_BYTES = 64 * 1024 * 1024  # append() seals the active file past this size
+COMPACT_TARGET_BYTES = 64 * 1024 * 1024  # compact() merges sealed segments up to this size
+HEAD_BYTES = 4096  # bytes hashed to recognise a rewritten file
+SCAN_BLOCK = 1024 * 1024  # bytes split into lines at a time
+INDEX_VERSION = 1
+
+
+def _dumps(event):
+    # Same shape as JSON.stringify: no spaces, non-ASCII kept as is
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+
+
+def _needle(field, value):
+    """Raw bytes a line must contain when field == value (None: no safe prefilter)"""
+    if not isinstance(value, str) or not value.isprintable() or '"' in value or "\\" in value:
+        return None
+    return f'"{field}":{_dumps(value)}'.encode()
+
+
+class SegmentIndex:
+    """Sparse timestamp -> byte offset index of one JSONL segment.
+
+    maxes[i] is the highest timestamp of the lines before byte offsets[i]
+    (-1 for none). size is the indexed length (always at a line boundary); head is the CRC of the
+    first HEAD_BYTES (or of all of it, while shorter), to tell an appended
+    file from a rewritten one.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.head = None
+        self.count = 0
+        self.min_ts = None
+        self.max_ts = None
+        self.maxes = []
+        self.offsets = []
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_VERSION:
+            return None
+        index = cls()
+        index.size, index.head, index.count = data["size"], data["head"], data["count"]
+        index.min_ts, index.max_ts = data["min_ts"], data["max_ts"]
+        index.maxes, index.offsets = data["maxes"], data["offsets"]
+        return index
+
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": INDEX_VERSION, "size": self.size, "head": self.head, "count": self.count,
+                       "min_ts": self.min_ts, "max_ts": self.max_ts,
+                       "maxes": self.maxes, "offsets": self.offsets}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def matches(self, mm):
+        """Is mm (the segment now) the file this index was built from, possibly grown?"""
+        if len(mm) < self.size or self.head != zlib.crc32(mm[:min(self.size, HEAD_BYTES)]):
+            return False
+        return self.size == 0 or mm[self.size - 1:self.size] == b"\n"
+
+    def extend(self, mm, stride=INDEX_STRIDE):
+        """Index the complete lines of mm past self.size"""
+        pos = self.size
+        running = self.max_ts if self.max_ts is not None else -1
+        last_mark = self.offsets[-1] if self.offsets else -stride
+        for offset, line in _lines(mm, self.size, len(mm)):
+            if offset - last_mark >= stride:
+                self.maxes.append(running)
+                self.offsets.append(offset)
+                last_mark = offset
+            ts = _timestamp(line)
+            if ts is not None:
+                self.count += 1
+                running = max(running, ts)
+                self.min_ts = ts if self.min_ts is None else min(self.min_ts, ts)
+                self.max_ts = running
+            pos = offset + len(line) + 1
+        grew = pos != self.size
+        if self.size < HEAD_BYTES:
+            self.head = zlib.crc32(mm[:min(pos, HEAD_BYTES)])
+        self.size = pos
+        return grew
+
+    def start(self, since):
+        """Offset from which every event with timestamp >= since follows"""
+        i = bisect.bisect_left(self.maxes, since) - 1
+        return self.offsets[i] if i >= 0 else 0
+
+
+TIMESTAMP_RE = re.compile(rb'"timestamp":(-?\d+)[,}]')
+
+
+def _timestamp(line):
+    """Top-level timestamp of a JSON line (None for a bad line)"""
+    found = TIMESTAMP_RE.findall(line)
+    if len(found) == 1 and line.startswith(b"{"):
+        # Quotes inside strings are escaped, so the only match is a key; a
+        # nested "timestamp" key would make a second match and take the slow path
+        return int(found[0])
+    if not line.strip():
+        return None
+    try:
+        return int(json.loads(line).get("timestamp") or 0)
+    except (ValueError, AttributeError):
+        return None  # skip bad lines, like EventStore.load()
+
+
+def _lines(mm, start, end, block=SCAN_BLOCK):
+    """(offset, line without newline) for the complete lines of mm[start:end]"""
+    pos = start
+    while pos < end:
+        chunk = mm[pos:min(pos + block, end)]
+        cut = chunk.rfind(b"\n")
+        if cut < 0:
+            if pos + len(chunk) >= end:
+                return  # a line still being written
+            block *= 2  # a line longer than the block
+            continue
+        for line in chunk[:cut].split(b"\n"):
+            yield pos, line
+            pos += len(line) + 1
+
+
+class EventLog:
+    """A rotating JSONL event log with sparse timestamp indexes.
+
+        log = EventLog()
+        for event in log.events(since=ts, world_type="chat"):
+            ...
+    """
+
+    SEGMENT_RE = re.compile(r"\.(\d{6})-(\d{6})$")
+
+    def __init__(self, path=EVENTS_FILE, stride=INDEX_STRIDE, rotate_bytes=ROTATE_BYTES):
+        self.path = path
+        self.stride = stride
+        self.rotate_bytes = rotate_bytes
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.stem, self.suffix = os.path.splitext(os.path.basename(path))
+        self._indexes = {}
+
+    # ── Segments ──────────────────────────────────────────────
+
+    def sealed(self):
+        """[(first, last, path)] of sealed segments, oldest first; ranges
+        already covered by a wider (compacted) one are left out"""
+        found = []
+        for name in os.listdir(self.directory):
+            base, ext = os.path.splitext(name)
+            if ext != self.suffix or not base.startswith(self.stem + "."):
+                continue
+            m = self.SEGMENT_RE.search(base)
+            if m and base[:m.start()] == self.stem:
+                found.append((int(m.group(1)), int(m.group(2)), os.path.join(self.directory, name)))
+        found.sort(key=lambda s: (s[0], -s[1]))
+        segments, covered = [], 0
+        for first, last, path in found:
+            if last > covered:
+                segments.append((first, last, path))
+                covered = last
+        return segments
+
+    def segments(self):
+        """Paths in read order: sealed segments, then the active file"""
+        return [path for _, _, path in self.sealed()] + [self.path]
+
+    def _segment_path(self, first, last):
+        return os.path.join(self.directory, f"{self.stem}.{first:06d}-{last:06d}{self.suffix}")
+
+    def index(self, path, mm=None):
+        """The up-to-date SegmentIndex of a segment (built, extended or
+        rebuilt as needed and saved next to it)"""
+        close = mm is None
+        if mm is None:
+            mm = _map(path)
+        try:
+            index = self._indexes.get(path) or SegmentIndex.load(path + ".idx")
+            if index is None or not index.matches(mm or b""):
+                index = SegmentIndex()
+            if mm is not None and index.extend(mm, self.stride):
+                index.save(path + ".idx")
+            self._indexes[path] = index
+            return index
+        finally:
+            if close and mm is not None:
+                mm.close()
+
+    # ── Reads ─────────────────────────────────────────────────
+
+    def events(self, since=0, until=None, world_type=None, agent_id=None):
+        """Events with since <= timestamp (<= until), in log order, parsed lazily"""
+        needles = [n for n in (_needle("worldType", world_type), _needle("agentId", agent_id)) if n]
+        for path in self.segments():
+            mm = _map(path)
+            if mm is None:
+                continue
+            try:
+                index = self.index(path, mm)
+                if index.count == 0 or index.max_ts < since or (until is not None and index.min_ts > until):
+                    continue
+                for _, line in _lines(mm, index.start(since), index.size):
+                    if not all(n in line for n in needles):
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    ts = int(event.get("timestamp") or 0)
+                    if ts < since or (until is not None and ts > until):
+                        continue
+                    if world_type is not None and event.get("worldType") != world_type:
+                        continue
+                    if agent_id is not None and event.get("agentId") != agent_id:
+                        continue
+                    yield event
+            finally:
+                mm.close()
+
+    def stats(self):
+        segments = []
+        for path in self.segments():
+            index = self.index(path)
+            segments.append({"path": os.path.relpath(path, self.directory), "bytes": index.size,
+                             "events": index.count, "min_ts": index.min_ts, "max_ts": index.max_ts,
+                             "marks": len(index.offsets)})
+        return {"events": sum(s["events"] for s in segments), "segments": segments}
+
+    # ── Writes ────────────────────────────────────────────────
+
+    def append(self, events):
+        """Append events to the active file (one write), rotating past rotate_bytes"""
+        data = "".join(_dumps(e) + "\n" for e in events).encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size >= self.rotate_bytes:
+            self.rotate()
+
+    def rotate(self):
+        """Seal the active file as the next segment; returns its path (None if empty)"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return None
+        sealed = self.sealed()
+        n = sealed[-1][1] + 1 if sealed else 1
+        target = self._segment_path(n, n)
+        index = self.index(self.path)
+        os.replace(self.path, target)
+        # Only complete lines were indexed; a torn tail stays in the sealed copy unread
+        index.save(target + ".idx")
+        self._indexes.pop(self.path, None)
+        try:
+            os.remove(self.path + ".idx")
+        except FileNotFoundError:
+            pass
+        return target
+
+    def compact(self, before=None, target_bytes=COMPACT_TARGET_BYTES):
+        """Merge runs of adjacent sealed segments up to target_bytes and drop
+        events older than before; returns (segments before, segments after)"""
+        sealed = self.sealed()
+        runs, run, run_bytes = [], [], 0
+        for segment in sealed:
+            size = os.path.getsize(segment[2])
+            if run and run_bytes + size > target_bytes:
+                runs.append(run)
+                run, run_bytes = [], 0
+            run.append(segment)
+            run_bytes += size
+        if run:
+            runs.append(run)
+
+        for run in runs:
+            if len(run) == 1:
+                index = self.index(run[0][2])
+                if before is None or (index.min_ts is not None and index.min_ts >= before):
+                    continue
+            target = self._segment_path(run[0][0], run[-1][1])
+            tmp = f"{target}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as out:
+                for _, _, path in run:
+                    for event in EventLog._read_all(path, since=before):
+                        out.write(event)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, target)
+            self._indexes.pop(target, None)
+            self.index(target)
+            # The wider range now covers the sources; a crash here leaves them skipped
+            for _, _, path in run:
+                if path != target:
+                    self._remove(path)
+            if os.path.getsize(target) == 0:
+                self._remove(target)
+        return len(sealed), len(self.sealed())
+
+    @staticmethod
+    def _read_all(path, since=None):
+        """Raw lines (with newline) of a segment, those with timestamp >= since
+        if given"""
+        mm = _map(path)
+        if mm is None:
+            return
+        try:
+            for _, line in _lines(mm, 0, len(mm)):
+                if since is None or (_timestamp(line) or -1) >= since:
+                    yield line + b"\n"
+        finally:
+            mm.close()
+
+    def _remove(self, path):
+        self._indexes.pop(path, None)
+        for p in (path, path + ".idx"):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+
+def _map(path):
+    """Read-only mmap of a file (None if it is missing or empty)"""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+# ── Benchmark ─────────────────────────────────────────────────
+
+def write_synthetic(path, count, agents=50, seed=0):
+    """An events.jsonl of join/chat/move events with slightly shuffled timestamps"""
+    import random
+
+    rng = random.Random(seed)
+    ts = 1771040673487
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            ts += rng.randrange(0, 400)
+            agent = f"agent-{rng.randrange(agents)}"
+            kind = rng.choices(("chat", "move", "join"), (6, 3, 1))[0]
+            event = {"worldType": kind, "agentId": agent}
+            if kind == "chat":
+                event["text"] = f"@agent-{rng.randrange(agents)} message {i} 🌊"
+            elif kind == "move":
+                event.update(x=rng.uniform(-50, 50), y=0, z=rng.uniform(-50, 50), rotation=0)
+            else:
+                event.update(name=agent, color="#00CED1", bio="bench", capabilities=[], skills=[])
+            # Events reach the server slightly out of order
+            event["timestamp"] = ts - rng.randrange(0, 1500)
+            f.write(_dumps(event) + "\n")
+    return ts
+
+
+def bench(count=1_000_000):
+    """Full-file parse (what offline tools do today) vs EventLog reads"""
+    import shutil
+    import tempfile
+
+    tmp = tempfile.mkdtemp(prefix="event-log-")
+    path = os.path.join(tmp, "events.jsonl")
+    last = write_synthetic(path, count)
+    recent = last - 60_000  # the last minute
+    print(f"{count} events, {os.path.getsize(path) / 1e6:.0f} MB")
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        n = fn()
+        print(f"{label:>34}: {(time.perf_counter() - start) * 1000:9.1f}ms  ({n} events)")
+
+    def full_scan(pred):
+        with open(path, encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip() and pred(json.loads(line)))
+
+    timed("full parse, last minute", lambda: full_scan(lambda e: e["timestamp"] >= recent))
+    timed("full parse, chat by agent-7",
+          lambda: full_scan(lambda e: e["worldType"] == "chat" and e["agentId"] == "agent-7"))
+
+    timed("index build (first open)", lambda: EventLog(path).index(path).count)
+    timed("EventLog, last minute", lambda: sum(1 for _ in EventLog(path).events(since=recent)))
+    timed("EventLog, chat by agent-7",
+          lambda: sum(1 for _ in EventLog(path).events(world_type="chat", agent_id="agent-7")))
+    timed("EventLog, last minute, chat",
+          lambda: sum(1 for _ in EventLog(path).events(since=recent, world_type="chat")))
+    print(f"{'index size':>34}: {os.path.getsize(path + '.idx') / 1024:9.1f}KB")
+
+    # Rotated into 16 segments, then compacted back
+    with open(path, "rb") as f:
+        lines = f.readlines()
+    os.remove(path)
+    os.remove(path + ".idx")
+    log = EventLog(path)
+    per = len(lines) // 16 + 1
+    for i in range(0, len(lines), per):
+        with open(path, "wb") as f:
+            f.writelines(lines[i:i + per])
+        log.rotate()
+    del lines
+    timed("16 segments, last minute", lambda: sum(1 for _ in EventLog(path).events(since=recent)))
+    start = time.perf_counter()
+    before, after = log.compact(target_bytes=os.path.getsize(log.sealed()[0][2]) * 4 + 1)
+    print(f"{'compact':>34}: {(time.perf_counter() - start) * 1000:9.1f}ms  ({before} -> {after} segments)")
+    timed("compacted, last minute", lambda: sum(1 for _ in EventLog(path).events(since=recent)))
+    shutil.rmtree(tmp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexed reader for the room event log")
+    parser.add_argument("--log", default=EVENTS_FILE, help=f"Active log file (default: {EVENTS_FILE})")
+    sub = parser.add_subparsers(dest="command")
+    query_p = sub.add_parser("query", help="Print matching events (JSON lines)")
+    query_p.add_argument("--since", type=int, default=0, help="Millisecond timestamp lower bound (inclusive)")
+    query_p.add_argument("--until", type=int, help="Millisecond timestamp upper bound (inclusive)")
+    query_p.add_argument("--type", dest="world_type", help="worldType (join, chat, move, ...)")
+    query_p.add_argument("--agent", dest="agent_id", help="agentId")
+    sub.add_parser("stats", help="Segments, event counts and index marks")
+    sub.add_parser("rotate", help="Seal the active file as a new segment")
+    compact_p = sub.add_parser("compact", help="Merge small sealed segments")
+    compact_p.add_argument("--before", type=int, help="Drop events older than this millisecond timestamp")
+    compact_p.add_argument("--target-mb", type=int, default=COMPACT_TARGET_BYTES // (1024 * 1024),
+                           help="Merged segment size (default: %(default)s)")
+    bench_p = sub.add_parser("bench", help="Compare against parsing the whole file")
+    bench_p.add_argument("--count", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    log = EventLog(args.log)
+    if args.command == "query":
+        for event in log.events(args.since, args.until, args.world_type, args.agent_id):
+            sys.stdout.write(_dumps(event) + "\n")
+    elif args.command == "stats":
+        print(json.dumps(log.stats(), indent=2))
+    elif args.command == "rotate":
+        print(f"[event-log] sealed {log.rotate()}")
+    elif args.command == "compact":
+        before, after = log.compact(args.before, args.target_mb * 1024 * 1024)
+        print(f"[event-log] {before} -> {after} sealed segments")
+    elif args.command == "bench":
+        bench(args.count)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+Segmented, indexed store for the Kaspa message log (messages.json).
+
+server/message-store.ts keeps every message in one pretty-printed JSON
+array, so answering getForAddress() means parsing the whole file. This
+store keeps the same records in append-only segments and indexes them:
+
+  <store>/segments/000001.jsonl   one compact JSON record per line; a new
+                                  segment starts past SEGMENT_MAX_BYTES
+  <store>/index.sqlite3           messages: seq (insertion order) ->
+                                    segment, byte offset, length, timestamp
+                                  postings: (address, seq) for the sender
+                                    and recipient of every message
+                                  messages_ts: timestamp index
+
+get_for_address(address, limit, since) has the semantics of the TS
+getForAddress(): the newest `limit` messages sent or received by address
+with timestamp >= since, oldest first. It walks the address's postings
+backwards and reads only those records (os.pread), whatever the log size.
+
+Legacy records (from/to/text) and protocol-v1 records (fromAddress/
+toAddress/protocol) are stored unchanged; legacy ones are indexed under
+their from/to names. A record id is stored once, so migrate can be
+re-run to pick up what the server appended since (older logs hold
+duplicates of one TX under different ids; they are kept as they are).
+add() drops a second message for the same TX and recipient, like
+MessageStore.add().
+
+Segment bytes are written before the index; on open, records past the
+indexed end of the last segment are re-indexed and a torn last line is
+cut off. A segment started by a rollover whose index transaction never
+committed has no row in the index; its file is removed on open.
+
+Usage: python3 message_store.py migrate [messages.json] [--store DIR]
+       python3 message_store.py query ADDRESS [--limit 100] [--since MS] [--store DIR]
+       python3 message_store.py recent [--limit 20] [--store DIR]
+       python3 message_store.py stats [--store DIR]
+       python3 message_store.py bench [--count 1000000] [--addresses 10000]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MESSAGES_FILE = os.path.join(ROOT, "messages.json")
+STORE_DIR = os.path.join(ROOT, "data", "messages")
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024  # a segment is sealed once it reaches this size
+MIGRATE_BATCH = 50_000  # records per index transaction during migrate
+READ_CHUNK = 1024 * 1024  # bytes read at a time when streaming a JSON array
+INDEX_CACHE_KB = 64 * 1024  # SQLite page cache of the index connection
+
+
+def sender_of(msg):
+    return msg.get("fromAddress") or msg.get("from")
+
+
+def recipient_of(msg):
+    return msg.get("toAddress") or msg.get("to")
+
+
+def tx_key(msg):
+    """Same TX to the same recipient is the same message (MessageStore.add)"""
+    return f"{msg['txId']}:{recipient_of(msg) or ''}" if msg.get("txId") else None
+
+
+def iter_json_array(path, chunk_size=READ_CHUNK):
+    """Yield the elements of a JSON array file one at a time, without
+    loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf, pos, started = f.read(chunk_size), 0, False
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buf):
+                buf, pos = f.read(chunk_size), 0
+                if not buf:
+                    return
+                continue
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"{path}: not a JSON array")
+                started, pos = True, pos + 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # The element runs past the buffer: read on and retry
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield obj
+            pos = end
+
+
+class MessageStore:
+    """Append-only segmented message log with address and timestamp indexes.
+
+        store = MessageStore()
+        store.add({"fromAddress": a, "toAddress": b, "protocol": {...}, "timestamp": ts, "txId": tx})
+        store.get_for_address(b, limit=50, since=ts)
+
+    One writer at a time; readers in other processes see committed
+    messages (the index runs in WAL mode).
+    """
+
+    def __init__(self, path=STORE_DIR, segment_max_bytes=SEGMENT_MAX_BYTES):
+        self.path = path
+        self.segment_max_bytes = segment_max_bytes
+        os.makedirs(os.path.join(path, "segments"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(path, "index.sqlite3"))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        # Postings arrive in address-random order; keep the hot index pages cached
+        self.db.execute(f"PRAGMA cache_size=-{INDEX_CACHE_KB}")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY,
+                bytes INTEGER NOT NULL,  -- indexed end of the segment
+                records INTEGER NOT NULL,
+                min_ts INTEGER,
+                max_ts INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY,
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                id TEXT UNIQUE,
+                tx_key TEXT
+            );
+            CREATE INDEX IF NOT EXISTS messages_ts ON messages (ts);
+            CREATE INDEX IF NOT EXISTS messages_tx ON messages (tx_key);
+            CREATE TABLE IF NOT EXISTS postings (
+                address TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                PRIMARY KEY (address, seq)
+            ) WITHOUT ROWID;
+        """)
+        self._fds = {}
+        self._recover()
+
+    # ── Segments ──────────────────────────────────────────────
+
+    def segment_path(self, segment):
+        return os.path.join(self.path, "segments", f"{segment:06d}.jsonl")
+
+    def _fd(self, segment):
+        if segment not in self._fds:
+            self._fds[segment] = os.open(self.segment_path(segment), os.O_RDONLY)
+        return self._fds[segment]
+
+    def _active(self):
+        """(segment id, indexed bytes) of the segment appends go to"""
+        row = self.db.execute("SELECT id, bytes FROM segments ORDER BY id DESC LIMIT 1").fetchone()
+        if row is None:
+            self.db.execute("INSERT INTO segments VALUES (1, 0, 0, NULL, NULL)")
+            return 1, 0
+        return row
+
+    def _recover(self):
+        """Index records written to the last segment after its index commit,
+        drop index rows whose bytes never reached it, and remove segment
+        files the index does not know about"""
+        segment, indexed = self._active()
+        for name in os.listdir(os.path.join(self.path, "segments")):
+            stem, ext = os.path.splitext(name)
+            if ext == ".jsonl" and stem.isdigit() and int(stem) > segment:
+                # Written by a rollover that crashed before its commit; appending
+                # to it later would index new records at offsets of these bytes
+                os.remove(os.path.join(self.path, "segments", name))
+        path = self.segment_path(segment)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < indexed:
+            indexed = self._forget_past(segment, size)
+        if size <= indexed:
+            return
+        with open(path, "rb") as f:
+            f.seek(indexed)
+            tail = f.read()
+        complete = tail[:tail.rfind(b"\n") + 1]
+        if len(complete) < len(tail):
+            # Torn write: the last line never made it to disk whole
+            os.truncate(path, indexed + len(complete))
+        with self.db:
+            offset, found = indexed, []
+            for line in complete.splitlines(keepends=True):
+                msg = json.loads(line)
+                new = self._index(segment, offset, len(line), msg)
+                if new:
+                    found.append((*new, msg))
+                offset += len(line)
+            self._finish(segment, offset, found)
+
+    def _forget_past(self, segment, size):
+        """Unindex records of segment that end past byte size (the commit
+        survived a power loss the segment's bytes did not); returns the new
+        indexed end"""
+        with self.db:
+            self.db.execute("""
+                DELETE FROM postings WHERE seq IN
+                    (SELECT seq FROM messages WHERE segment = ? AND offset + length > ?)
+            """, (segment, size))
+            self.db.execute("DELETE FROM messages WHERE segment = ? AND offset + length > ?", (segment, size))
+            end, records, low, high = self.db.execute(
+                "SELECT coalesce(max(offset + length), 0), count(*), min(ts), max(ts) FROM messages WHERE segment = ?",
+                (segment,)).fetchone()
+            self.db.execute("UPDATE segments SET bytes = ?, records = ?, min_ts = ?, max_ts = ? WHERE id = ?",
+                            (end, records, low, high, segment))
+        return end
+
+    def _index(self, segment, offset, length, msg):
+        """Index one record's location; its (seq, ts), or None if its id is
+        already stored"""
+        ts = int(msg.get("timestamp") or 0)
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO messages (segment, offset, length, ts, id, tx_key) VALUES (?, ?, ?, ?, ?, ?)",
+            (segment, offset, length, ts, msg.get("id"), tx_key(msg)))
+        return (cur.lastrowid, ts) if cur.rowcount else None
+
+    def _finish(self, segment, end, indexed):
+        """Postings and segment stats for [(seq, ts, msg)] indexed into segment,
+        which is now indexed up to byte end"""
+        if not indexed:
+            self.db.execute("UPDATE segments SET bytes = ? WHERE id = ?", (end, segment))
+            return
+        # Sorted, consecutive inserts land on the same index pages
+        self.db.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?, ?)",
+                            sorted((a, seq, ts) for seq, ts, msg in indexed
+                                   for a in {sender_of(msg), recipient_of(msg)} if a))
+        low, high = min(ts for _, ts, _ in indexed), max(ts for _, ts, _ in indexed)
+        self.db.execute("""
+            UPDATE segments SET bytes = ?, records = records + ?,
+                min_ts = min(coalesce(min_ts, ?), ?), max_ts = max(coalesce(max_ts, ?), ?)
+            WHERE id = ?
+        """, (end, len(indexed), low, low, high, high, segment))
+
+    # ── Writes ────────────────────────────────────────────────
+
+    def add_many(self, messages):
+        """Append messages in one index transaction; returns how many were new.
+
+        Records are indexed first (inside the transaction), so ids already
+        stored are dropped before anything is written, then appended to the
+        segment, synced, and the transaction commits.
+        """
+        segment, end = self._active()
+        pending, indexed, added = [], [], 0
+        f = open(self.segment_path(segment), "ab")
+        # Bytes past the indexed end belong to a batch that failed before its commit
+        f.truncate(end)
+        try:
+            with self.db:
+                for msg in messages:
+                    line = json.dumps(msg, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+                    if end and end + len(line) > self.segment_max_bytes:
+                        f.writelines(pending)
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+                        self._finish(segment, end, indexed)
+                        pending, indexed, segment, end = [], [], segment + 1, 0
+                        self.db.execute("INSERT INTO segments VALUES (?, 0, 0, NULL, NULL)", (segment,))
+                        # A new segment starts empty, whatever an earlier crashed rollover left there
+                        f = open(self.segment_path(segment), "wb")
+                    found = self._index(segment, end, len(line), msg)
+                    if found:
+                        indexed.append((*found, msg))
+                        pending.append(line)
+                        end += len(line)
+                        added += 1
+                f.writelines(pending)
+                f.flush()
+                os.fsync(f.fileno())
+                self._finish(segment, end, indexed)
+        finally:
+            f.close()
+        return added
+
+    def add(self, msg):
+        """Append one message; returns it, or the stored copy of a duplicate"""
+        key = tx_key(msg)
+        row = key and self.db.execute("SELECT segment, offset, length FROM messages WHERE tx_key = ? LIMIT 1",
+                                      (key,)).fetchone()
+        if row:
+            return self._read(*row)
+        if "id" not in msg:
+            msg = {**msg, "id": f"msg_{int(time.time() * 1000)}_{random.randbytes(3).hex()}"}
+        self.add_many([msg])
+        return msg
+
+    def migrate(self, json_path=MESSAGES_FILE, batch=MIGRATE_BATCH):
+        """Copy a messages.json array into the store; returns (read, added)"""
+        read = added = 0
+        chunk = []
+        for msg in iter_json_array(json_path):
+            chunk.append(msg)
+            if len(chunk) == batch:
+                added += self.add_many(chunk)
+                read += len(chunk)
+                chunk = []
+        added += self.add_many(chunk)
+        return read + len(chunk), added
+
+    # ── Queries ───────────────────────────────────────────────
+
+    def _read(self, segment, offset, length):
+        return json.loads(os.pread(self._fd(segment), length, offset))
+
+    def get_for_address(self, address, limit=100, since=0):
+        """Newest `limit` messages sent or received by address with
+        timestamp >= since, oldest first (MessageStore.getForAddress)"""
+        rows = self.db.execute("""
+            SELECT m.segment, m.offset, m.length FROM postings p JOIN messages m ON m.seq = p.seq
+            WHERE p.address = ? AND p.ts >= ? ORDER BY p.seq DESC LIMIT ?
+        """, (address, since, limit)).fetchall()
+        return [self._read(*row) for row in reversed(rows)]
+
+    def get_recent(self, limit=20):
+        rows = self.db.execute("SELECT segment, offset, length FROM messages ORDER BY seq DESC LIMIT ?",
+                               (limit,)).fetchall()
+        return [self._read(*row) for row in reversed(rows)]
+
+    def iter_since(self, since=0):
+        """Every message with timestamp >= since, in timestamp order (streamed)"""
+        for row in self.db.execute("SELECT segment, offset, length FROM messages WHERE ts >= ? ORDER BY ts, seq",
+                                   (since,)):
+            yield self._read(*row)
+
+    def count_since(self, since):
+        return self.db.execute("SELECT count(*) FROM messages WHERE ts >= ?", (since,)).fetchone()[0]
+
+    def get_total(self):
+        return self.db.execute("SELECT count(*) FROM messages").fetchone()[0]
+
+    def get_last_24h(self):
+        return self.count_since(int(time.time() * 1000) - 24 * 60 * 60 * 1000)
+
+    def get_stats(self):
+        today = time.localtime()
+        today_ts = int(time.mktime((today.tm_year, today.tm_mon, today.tm_mday, 0, 0, 0, 0, 0, -1)) * 1000)
+        segments = self.db.execute("SELECT count(*), sum(bytes) FROM segments").fetchone()
+        return {"total": self.get_total(), "today": self.count_since(today_ts),
+                "segments": segments[0], "bytes": segments[1] or 0}
+
+    def close(self):
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+        self.db.close()
+
+
+# ── Benchmark ─────────────────────────────────────────────────
+
+def write_synthetic(path, count, addresses, seed=0):
+    """A pretty-printed messages.json like MessageStore.flush() writes:
+    5% legacy records, the rest protocol-v1 between random addresses"""
+    rng = random.Random(seed)
+    names = ["nami", "bob", "alice", "ryan"]
+    ts = 1771179100000
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(count):
+            ts += rng.randrange(0, 2000)
+            if rng.random() < 0.05:
+                msg = {"from": rng.choice(names), "to": rng.choice(names), "text": f"hello {i}"}
+            else:
+                msg = {"fromAddress": rng.choice(addresses), "toAddress": rng.choice(addresses),
+                       "protocol": {"v": 1, "t": "msg", "d": rng.randbytes(90).hex()[:120], "a": {}}}
+            msg.update(timestamp=ts, txId=f"{i:064x}", status="confirmed", id=f"msg_{i}")
+            text = json.dumps(msg, ensure_ascii=False, indent=2)
+            f.write("  " + text.replace("\n", "\n  ") + (",\n" if i < count - 1 else "\n"))
+        f.write("]")
+
+
+def bench(count=1_000_000, n_addresses=10_000, queries=200):
+    """messages.json (full parse + filter, what the server does) vs the store"""
+    import shutil
+    import statistics
+    import tempfile
+
+    tmp = tempfile.mkdtemp(prefix="message-store-")
+    json_path = os.path.join(tmp, "messages.json")
+    addresses = [f"kaspatest:q{i:060x}" for i in range(n_addresses)]
+    rng = random.Random(1)
+    sample = [rng.choice(addresses) for _ in range(queries)]
+
+    start = time.perf_counter()
+    write_synthetic(json_path, count, addresses)
+    print(f"{count} messages, {n_addresses} addresses: messages.json {os.path.getsize(json_path) / 1e6:.0f} MB "
+          f"(written in {time.perf_counter() - start:.1f}s)")
+
+    def percentiles(samples):
+        samples = sorted(samples)
+        return (f"p50 {statistics.median(samples) * 1000:8.3f}ms  "
+                f"p99 {samples[int(len(samples) * 0.99) - 1] * 1000:8.3f}ms")
+
+    # Baseline: parse the array, then filter it per query like getForAddress()
+    start = time.perf_counter()
+    with open(json_path, encoding="utf-8") as f:
+        messages = json.load(f)
+    parse = time.perf_counter() - start
+    since = messages[len(messages) // 2]["timestamp"]
+    timings = []
+    for address in sample[:20]:
+        start = time.perf_counter()
+        [m for m in messages if (m.get("fromAddress") == address or m.get("toAddress") == address)
+         and m["timestamp"] >= since][-50:]
+        timings.append(time.perf_counter() - start)
+    del messages
+    print(f"{'json.load + filter':>24}: parse {parse:6.2f}s, query {percentiles(timings)}")
+
+    start = time.perf_counter()
+    store = MessageStore(os.path.join(tmp, "store"))
+    read, added = store.migrate(json_path)
+    migrate = time.perf_counter() - start
+    stats = store.get_stats()
+    store.close()
+    print(f"{'migrate':>24}: {migrate:6.2f}s ({read / migrate:,.0f} msg/s), {added} added, "
+          f"{stats['segments']} segments, {stats['bytes'] / 1e6:.0f} MB")
+
+    start = time.perf_counter()
+    store = MessageStore(os.path.join(tmp, "store"))
+    opened = time.perf_counter() - start
+    for label, kwargs in (("getForAddress(50)", {"limit": 50}),
+                          ("getForAddress(50, since)", {"limit": 50, "since": since})):
+        timings = []
+        for address in sample:
+            start = time.perf_counter()
+            found = store.get_for_address(address, **kwargs)
+            timings.append(time.perf_counter() - start)
+            assert all(address in (m.get("fromAddress"), m.get("toAddress")) for m in found)
+        print(f"{label:>24}: open {opened * 1000:6.1f}ms, query {percentiles(timings)}")
+    start = time.perf_counter()
+    again = store.migrate(json_path)[1]
+    print(f"{'re-migrate (no changes)':>24}: {time.perf_counter() - start:6.2f}s, {again} added")
+    store.close()
+    shutil.rmtree(tmp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmented, indexed Kaspa message store")
+    parser.add_argument("--store", default=STORE_DIR, help=f"Store directory (default: {STORE_DIR})")
+    sub = parser.add_subparsers(dest="command")
+    migrate_p = sub.add_parser("migrate", help="Copy messages.json into the store (idempotent)")
+    migrate_p.add_argument("source", nargs="?", default=MESSAGES_FILE)
+    query_p = sub.add_parser("query", help="Messages sent or received by an address (JSON lines)")
+    query_p.add_argument("address")
+    query_p.add_argument("--limit", type=int, default=100)
+    query_p.add_argument("--since", type=int, default=0, help="Millisecond timestamp lower bound")
+    recent_p = sub.add_parser("recent", help="Most recent messages (JSON lines)")
+    recent_p.add_argument("--limit", type=int, default=20)
+    sub.add_parser("stats", help="Message counts and store size")
+    bench_p = sub.add_parser("bench", help="Compare against parsing messages.json")
+    bench_p.add_argument("--count", type=int, default=1_000_000)
+    bench_p.add_argument("--addresses", type=int, default=10_000)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args.count, args.addresses)
+        return
+    if args.command is None:
+        parser.print_help()
+        return
+
+    store = MessageStore(args.store)
+    try:
+        if args.command == "migrate":
+            start = time.perf_counter()
+            read, added = store.migrate(args.source)
+            print(f"[message-store] {read} read, {added} added in {time.perf_counter() - start:.1f}s → {args.store}")
+        elif args.command == "stats":
+            print(json.dumps(store.get_stats()))
+        else:
+            found = (store.get_for_address(args.address, args.limit, args.since) if args.command == "query"
+                     else store.get_recent(args.limit))
+            for msg in found:
+                sys.stdout.write(json.dumps(msg, ensure_ascii=False, separators=(",", ":")) + "\n")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
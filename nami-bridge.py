@@ -5,26 +5,150 @@ Nami TG ↔ OpenClaw World Bridge
 
 重構：使用共用的 httpx.AsyncClient，復用 TCP connection
 (Thanks Bob for the suggestion! 🔍)
+
+大量指令：WorldBridge(pipeline=CommandPipeline()) 會把指令合併成 /ipc batch
+多 agent：BridgePool().bridge(agent_id) 共用同一個 connection pool
+同步環境：SyncWorldBridge / sync_* 共用一個常駐背景 event loop
+Benchmark：python3 nami-bridge.py --bench [pipeline|pool|sync] [count]
 """
 
 import httpx
 import asyncio
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Optional
 
 OPENCLAW_WORLD_URL = "http://127.0.0.1:18800/ipc"
 AGENT_ID = "nami"
 
+MAX_BATCH = 100  # server 端 MAX_IPC_BATCH
+
+
+class CommandPipeline:
+    """IPC 指令管線 - 排隊後依數量或時間合併送出
+
+    submit() 立即回傳 Future，flush 後各自拿到自己的結果。
+    batch=True 時一次 POST {"batch": [...]}；batch=False 時逐筆送，
+    但同時最多 max_in_flight 個 request（適用不支援 batch 的舊 server）。
+    需要嚴格順序（例如 register 後馬上 chat）請用 max_in_flight=1。
+    """
+
+    def __init__(self, url: str = OPENCLAW_WORLD_URL, client: Optional[httpx.AsyncClient] = None,
+                 max_batch: int = 32, max_delay: float = 0.005, max_in_flight: int = 4,
+                 batch: bool = True):
+        self.url = url
+        self.max_batch = min(max_batch, MAX_BATCH)
+        self.max_delay = max_delay
+        self.batch = batch
+        self._client = client
+        self._owns_client = client is None
+        self._window = asyncio.Semaphore(max_in_flight)
+        self._queue: list = []  # [(entry, future)]
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def get_client(self) -> httpx.AsyncClient:
+        """取得送指令用的 HTTP client（WorldBridge 也共用這個）"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=10.0)
+            self._owns_client = True
+        return self._client
+
+    def submit(self, command: str, args: dict = None, token: str = None) -> asyncio.Future:
+        """排入一個指令，回傳該指令結果的 Future"""
+        loop = asyncio.get_running_loop()
+        entry = {"command": command, "args": args or {}}
+        if token:
+            entry["token"] = token
+        future = loop.create_future()
+        self._queue.append((entry, future))
+        if len(self._queue) >= self.max_batch:
+            self._flush_queue()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_queue)
+        return future
+
+    def _flush_queue(self):
+        """把目前排隊的指令交給背景 task 送出"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._queue:
+            return
+        pending, self._queue = self._queue, []
+        loop = asyncio.get_running_loop()
+        if self.batch:
+            jobs = [self._send_batch(pending)]
+        else:
+            jobs = [self._send_one(entry, future) for entry, future in pending]
+        for job in jobs:
+            task = loop.create_task(job)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send_batch(self, pending: list):
+        async with self._window:
+            try:
+                client = await self.get_client()
+                resp = await client.post(self.url, json={"batch": [entry for entry, _ in pending]})
+                data = resp.json()
+                results = data.get("results") if isinstance(data, dict) else None
+                if not isinstance(results, list) or len(results) != len(pending):
+                    raise RuntimeError(f"Unexpected batch response: {data}")
+            except Exception as ex:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(ex)
+                return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _send_one(self, entry: dict, future: asyncio.Future):
+        async with self._window:
+            try:
+                client = await self.get_client()
+                resp = await client.post(self.url, json=entry)
+                result = resp.json()
+            except Exception as ex:
+                if not future.done():
+                    future.set_exception(ex)
+                return
+        if not future.done():
+            future.set_result(result)
+
+    async def flush(self):
+        """立即送出排隊中的指令，並等所有 in-flight request 完成"""
+        self._flush_queue()
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self):
+        """送完剩下的指令並關閉自己建立的 HTTP client"""
+        await self.flush()
+        if self._owns_client and self._client and not self._client.is_closed:
+            await self._client.aclose()
+            self._client = None
+
 
 class WorldBridge:
     """OpenClaw World 連線橋接器 - 使用共用的 HTTP client"""
     
-    def __init__(self, url: str = OPENCLAW_WORLD_URL, agent_id: str = AGENT_ID):
+    def __init__(self, url: str = OPENCLAW_WORLD_URL, agent_id: str = AGENT_ID,
+                 pipeline: Optional[CommandPipeline] = None):
         self.url = url
         self.agent_id = agent_id
+        self.pipeline = pipeline  # CommandPipeline / BridgePool，設定後指令改由它送出
+        self.token: Optional[str] = None  # register 取得，agent 指令需要
         self._client: Optional[httpx.AsyncClient] = None
     
     async def _get_client(self) -> httpx.AsyncClient:
         """取得或建立共用的 HTTP client"""
+        if self.pipeline is not None:
+            return await self.pipeline.get_client()
         if self._client is None or self._client.is_closed:
             self._client = httpx.AsyncClient(timeout=10.0)
         return self._client
@@ -37,11 +161,13 @@ class WorldBridge:
     
     async def _post(self, command: str, args: dict = None) -> dict:
         """發送 IPC 指令"""
+        if self.pipeline is not None:
+            return await self.pipeline.submit(command, args, self.token)
+        body = {"command": command, "args": args or {}}
+        if self.token:
+            body["token"] = self.token
         client = await self._get_client()
-        resp = await client.post(self.url, json={
-            "command": command,
-            "args": args or {}
-        })
+        resp = await client.post(self.url, json=body)
         return resp.json()
     
     async def register(self, name: str = "Nami 🌊", bio: str = "CTO 技術長 - Kaspa 專家",
@@ -53,13 +179,16 @@ class WorldBridge:
                 {"skillId": "blockchain", "name": "區塊鏈", "description": "Kaspa"},
                 {"skillId": "architecture", "name": "系統架構"}
             ]
-        return await self._post("register", {
+        result = await self._post("register", {
             "agentId": self.agent_id,
             "name": name,
             "bio": bio,
             "color": color,
             "skills": skills
         })
+        if isinstance(result, dict) and result.get("token"):
+            self.token = result["token"]
+        return result
     
     async def chat(self, text: str) -> dict:
         """發送聊天訊息"""
@@ -104,16 +233,263 @@ class WorldBridge:
             return False
 
 
+class _TokenBucket:
+    """每個 agent 的速率限制：每秒 rate 個，最多累積 burst 個"""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)  # burst < 1 永遠湊不到一個 token
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """還要等幾秒才有 token（0 表示現在就能送）"""
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _AgentLane:
+    """單一 agent 的速率限制與統計（所有 event loop 共用）"""
+
+    __slots__ = ("bucket", "sent", "waited")
+
+    def __init__(self, bucket: Optional[_TokenBucket]):
+        self.bucket = bucket
+        self.sent = 0
+        self.waited = 0.0  # 指令在佇列裡等待的總秒數
+
+
+class _LoopState:
+    """BridgePool 綁在單一 event loop 上的部分：連線、佇列與 dispatcher"""
+
+    def __init__(self, max_in_flight: int):
+        self.client: Optional[httpx.AsyncClient] = None
+        self.pipeline: Optional[CommandPipeline] = None
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.wakeup = asyncio.Event()
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.tasks: set = set()
+        self.queues: dict = {}  # agentId -> deque[(entry, future, queued_at)]
+        self.ready = deque()  # 有待送指令的 agentId（round-robin 順序）
+
+
+class BridgePool:
+    """多 agent 共用一個 keep-alive connection pool 與 event loop
+
+    每個 agent 有自己的 token bucket（預設 20 cmd/s，對齊 server 的 MAX_CMD_RATE），
+    dispatcher 以 round-robin 輪流從各 agent 佇列取指令，單一 agent 灌爆也不會
+    佔滿連線。batch=True 時改用 CommandPipeline 把送出的指令合併成 /ipc batch。
+
+    連線、佇列與 dispatcher 依 event loop 分開保存：全域 pool 可以同時被
+    sync_* 的背景 loop 與 asyncio.run() 使用，互不影響；loop 關閉後它的
+    狀態才被丟掉。速率限制與統計則是各 loop 共用。
+
+        pool = BridgePool()
+        bridges = [pool.bridge(f"agent-{i}") for i in range(50)]
+        await asyncio.gather(*(b.register(name=b.agent_id) for b in bridges))
+        await asyncio.gather(*(b.move(1, 2) for b in bridges))
+        await pool.close()
+    """
+
+    def __init__(self, url: str = OPENCLAW_WORLD_URL, max_connections: int = 16,
+                 keepalive_expiry: float = 30.0, rate: Optional[float] = 20.0,
+                 burst: float = 20, batch: bool = False):
+        self.url = url
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        # in-flight request 不超過連線數：多出來的 request 在 httpx pool 裡排隊反而更慢。
+        # 逐筆送時一個指令就是一個 request；batch 模式一個 /ipc batch 才佔一條連線，
+        # 由 CommandPipeline 的 max_in_flight 限制
+        self.max_in_flight = max_connections
+        self.rate = rate
+        self.burst = burst
+        self.batch = batch
+        self._bridges: dict = {}  # agentId -> WorldBridge
+        self._lanes: dict = {}  # agentId -> _AgentLane
+        self._limits: dict = {}  # agentId -> (rate, burst) 個別設定
+        self._states: dict = {}  # event loop -> _LoopState
+        self._lock = threading.Lock()  # 不同 loop 可能在不同 thread
+
+    def bridge(self, agent_id: str, rate: Optional[float] = None,
+               burst: Optional[float] = None) -> "WorldBridge":
+        """取得（或建立）某個 agent 的 WorldBridge，可個別覆寫速率限制（rate=0 表示不限速）"""
+        if rate is not None or burst is not None:
+            rate = self.rate if rate is None else rate
+            burst = self.burst if burst is None else burst
+            self._limits[agent_id] = (rate, burst)
+            if agent_id in self._lanes:
+                self._lanes[agent_id].bucket = _TokenBucket(rate, burst) if rate else None
+        if agent_id not in self._bridges:
+            self._bridges[agent_id] = WorldBridge(self.url, agent_id, pipeline=self)
+        return self._bridges[agent_id]
+
+    def _state(self) -> _LoopState:
+        """目前 event loop 的狀態（第一次用到時建立，順便丟掉已關閉 loop 的）"""
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            with self._lock:
+                for old in [l for l in self._states if l.is_closed()]:
+                    del self._states[old]
+                state = self._states[loop] = _LoopState(self.max_in_flight)
+        return state
+
+    async def get_client(self) -> httpx.AsyncClient:
+        """目前 event loop 上所有 agent 共用的 HTTP client"""
+        state = self._state()
+        if state.client is None or state.client.is_closed:
+            state.client = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ))
+        return state.client
+
+    def _lane(self, agent_id: str) -> _AgentLane:
+        lane = self._lanes.get(agent_id)
+        if lane is None:
+            with self._lock:
+                lane = self._lanes.get(agent_id)
+                if lane is None:
+                    rate, burst = self._limits.get(agent_id, (self.rate, self.burst))
+                    lane = self._lanes[agent_id] = _AgentLane(_TokenBucket(rate, burst) if rate else None)
+        return lane
+
+    def submit(self, command: str, args: dict = None, token: str = None) -> asyncio.Future:
+        """排入一個指令（依 args.agentId 分佇列），回傳結果的 Future"""
+        state = self._state()
+        entry = {"command": command, "args": args or {}}
+        if token:
+            entry["token"] = token
+        agent_id = entry["args"].get("agentId", "")
+        self._lane(agent_id)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = state.queues.setdefault(agent_id, deque())
+        if not queue:
+            state.ready.append(agent_id)
+        queue.append((entry, future, time.monotonic()))
+        state.wakeup.set()
+        if state.dispatcher is None or state.dispatcher.done():
+            state.dispatcher = loop.create_task(self._dispatch(state))
+        return future
+
+    async def _dispatch(self, state: _LoopState):
+        """Round-robin 取指令：跳過還在限速中的 agent，同時最多 max_connections 個 request"""
+        loop = asyncio.get_running_loop()
+        while True:
+            if not state.ready:
+                state.wakeup.clear()
+                await state.wakeup.wait()
+                continue
+            if not self.batch:
+                await state.slots.acquire()
+            now = time.monotonic()
+            wait = None
+            for _ in range(len(state.ready)):
+                agent_id = state.ready.popleft()
+                lane = self._lanes[agent_id]
+                delay = lane.bucket.delay(now) if lane.bucket else 0.0
+                if delay == 0.0:
+                    break
+                state.ready.append(agent_id)
+                wait = delay if wait is None else min(wait, delay)
+            else:
+                # 所有排隊中的 agent 都在限速，等最快恢復的那個（或新指令）
+                if not self.batch:
+                    state.slots.release()
+                state.wakeup.clear()
+                try:
+                    await asyncio.wait_for(state.wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if lane.bucket:
+                lane.bucket.take()
+            queue = state.queues[agent_id]
+            entry, future, queued_at = queue.popleft()
+            if queue:
+                state.ready.append(agent_id)
+            lane.sent += 1
+            lane.waited += now - queued_at
+            task = loop.create_task(self._send(state, entry, future))
+            state.tasks.add(task)
+            task.add_done_callback(state.tasks.discard)
+
+    async def _send(self, state: _LoopState, entry: dict, future: asyncio.Future):
+        try:
+            if self.batch:
+                if state.pipeline is None:
+                    state.pipeline = CommandPipeline(self.url, client=await self.get_client(),
+                                                     max_in_flight=self.max_connections)
+                result = await state.pipeline.submit(entry["command"], entry["args"], entry.get("token"))
+            else:
+                client = await self.get_client()
+                result = (await client.post(self.url, json=entry)).json()
+        except Exception as ex:
+            if not future.done():
+                future.set_exception(ex)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            if not self.batch:
+                state.slots.release()
+
+    def stats(self) -> dict:
+        """各 agent 已送數量、排隊數量與平均排隊時間"""
+        states = list(self._states.values())
+        return {
+            agent_id: {
+                "sent": lane.sent,
+                "queued": sum(len(s.queues.get(agent_id, ())) for s in states),
+                "avg_wait_ms": round(lane.waited / lane.sent * 1000, 3) if lane.sent else 0.0,
+            }
+            for agent_id, lane in list(self._lanes.items())
+        }
+
+    async def close(self):
+        """等待目前 event loop 上送出中的指令並關閉它的 client"""
+        state = self._states.get(asyncio.get_running_loop())
+        if state is None:
+            return
+        while state.ready or state.tasks:
+            if state.tasks:
+                await asyncio.gather(*list(state.tasks), return_exceptions=True)
+            else:
+                await asyncio.sleep(0.001)
+        if state.dispatcher is not None:
+            state.dispatcher.cancel()
+        if state.pipeline is not None:
+            await state.pipeline.close()
+        if state.client is not None and not state.client.is_closed:
+            await state.client.aclose()
+        with self._lock:
+            self._states.pop(asyncio.get_running_loop(), None)
+
+
 # === 全域 bridge 實例（方便快速使用）===
-_bridge: Optional[WorldBridge] = None
+_pool: Optional[BridgePool] = None
+
+
+def get_pool() -> BridgePool:
+    """取得全域 BridgePool（同一 process 內的所有 agent 共用）"""
+    global _pool
+    if _pool is None:
+        _pool = BridgePool()
+    return _pool
 
 
-def get_bridge() -> WorldBridge:
-    """取得全域 bridge 實例"""
-    global _bridge
-    if _bridge is None:
-        _bridge = WorldBridge()
-    return _bridge
+def get_bridge(agent_id: str = AGENT_ID) -> WorldBridge:
+    """取得全域 bridge 實例（預設 Nami）"""
+    return get_pool().bridge(agent_id)
 
 
 # === 向下相容的函數 API ===
@@ -150,24 +526,340 @@ async def is_server_running() -> bool:
 
 # === 同步函數（給非 async 環境用）===
 
+class BackgroundLoop:
+    """背景 thread 上常駐的 event loop
+
+    同步呼叫都丟到同一個 loop 上跑，httpx 的 keep-alive 連線因此能一直重用，
+    不用像 asyncio.run() 每次都建新 loop、重新 TCP connect。
+    """
+
+    def __init__(self, name: str = "nami-bridge-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_running(self) -> asyncio.AbstractEventLoop:
+        loop, thread = self._loop, self._thread
+        if loop is not None and thread.is_alive():
+            return loop
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name=self.name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """在背景 loop 上執行 coroutine 並等結果（不能在背景 loop 自己的 thread 裡呼叫）"""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run() called from its own loop thread")
+        loop = self._ensure_running()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+    def stop(self):
+        """停止背景 loop（下次 run() 會自動重建）"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is not None and thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self._cancel_tasks(), loop).result(5)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+
+    @staticmethod
+    async def _cancel_tasks():
+        """取消 loop 上剩下的 task（例如 BridgePool 的 dispatcher）"""
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_sync_loop = BackgroundLoop()
+
+
+class SyncWorldBridge:
+    """WorldBridge 的同步版 facade，所有呼叫共用同一個背景 loop"""
+
+    def __init__(self, bridge: Optional[WorldBridge] = None, loop: Optional[BackgroundLoop] = None):
+        self.bridge = bridge or get_bridge()
+        self._loop = loop or _sync_loop
+
+    def register(self, **kwargs) -> dict:
+        return self._loop.run(self.bridge.register(**kwargs))
+
+    def chat(self, text: str) -> dict:
+        return self._loop.run(self.bridge.chat(text))
+
+    def action(self, action: str) -> dict:
+        return self._loop.run(self.bridge.action(action))
+
+    def move(self, x: float, z: float, y: float = 0) -> dict:
+        return self._loop.run(self.bridge.move(x, z, y))
+
+    def leave(self) -> dict:
+        return self._loop.run(self.bridge.leave())
+
+    def get_events(self, limit: int = 20) -> dict:
+        return self._loop.run(self.bridge.get_events(limit))
+
+    def is_server_running(self) -> bool:
+        return self._loop.run(self.bridge.is_server_running())
+
+
 def sync_chat(text: str):
     """同步版發送聊天"""
-    return asyncio.run(send_chat(text))
+    return _sync_loop.run(send_chat(text))
 
 
 def sync_action(action: str):
     """同步版執行動作"""
-    return asyncio.run(do_action(action))
+    return _sync_loop.run(do_action(action))
 
 
 def sync_register():
     """同步版註冊"""
-    return asyncio.run(register_nami())
+    return _sync_loop.run(register_nami())
+
+
+# === 離線 benchmark 用的 /ipc 替身 server ===
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # 多 agent benchmark 會同時開很多連線
+
+
+class StubWorldServer:
+    """In-process 的 /ipc 替身（背景 thread），支援單筆與 batch 指令
+
+    latency 模擬每個 HTTP request 的 server 處理時間（秒）。
+
+        with StubWorldServer(latency=0.002) as server:
+            bridge = WorldBridge(server.url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        self.commands = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._httpd = _StubHTTPServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+        host, port = self._httpd.server_address[:2]
+        self.base_url = f"http://{host}:{port}"
+        self.url = f"{self.base_url}/ipc"
+
+    def handle_command(self, entry: dict) -> dict:
+        """回應單一指令（只模擬回應格式，不維護世界狀態）"""
+        command = entry.get("command")
+        args = entry.get("args") or {}
+        if command == "register":
+            agent_id = args.get("agentId", "")
+            return {"ok": True, "profile": {"agentId": agent_id}, "token": f"stub-{agent_id}"}
+        if command in ("world-move", "world-action", "world-chat", "world-leave"):
+            if entry.get("token") != f"stub-{args.get('agentId', '')}":
+                return {"error": "Error: Invalid or missing auth token. Register first to get a token."}
+            return {"ok": True}
+        if command == "room-events":
+            return {"ok": True, "events": []}
+        return {"error": f"Error: Unknown command: {command}"}
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, data: dict):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._reply(200, {"status": "ok"})
+                else:
+                    self._reply(404, {"error": "Not found"})
+
+            def do_POST(self):
+                parsed = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if stub.latency:
+                    time.sleep(stub.latency)
+                batch = parsed.get("batch") if isinstance(parsed, dict) else None
+                entries = batch if isinstance(batch, list) else [parsed]
+                with stub._lock:
+                    stub.requests += 1
+                    stub.commands += len(entries)
+                results = [stub.handle_command(e) for e in entries]
+                if isinstance(batch, list):
+                    self._reply(200, {"ok": True, "results": results})
+                else:
+                    self._reply(200 if "error" not in results[0] else 400, results[0])
+
+        return Handler
+
+    def start(self) -> "StubWorldServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StubWorldServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+async def bench_pipeline(commands: int = 2000, latency: float = 0.001):
+    """比較逐筆 POST 與 CommandPipeline 的吞吐量"""
+    with StubWorldServer(latency=latency) as server:
+        bridge = WorldBridge(server.url, agent_id="bench")
+        await bridge.register()
+        start = time.perf_counter()
+        for i in range(commands):
+            await bridge.move(i % 20, i % 20)
+        serial = time.perf_counter() - start
+        await bridge.close()
+        print(f" serial: {commands / serial:9.0f} cmd/s  ({server.requests - 1} requests)")
+
+        for label, pipeline in (
+            ("window", CommandPipeline(server.url, batch=False, max_in_flight=8)),
+            ("batch", CommandPipeline(server.url, max_batch=32)),
+        ):
+            piped = WorldBridge(server.url, agent_id="bench", pipeline=pipeline)
+            piped.token = bridge.token
+            before = server.requests
+            start = time.perf_counter()
+            results = await asyncio.gather(*(piped.move(i % 20, i % 20) for i in range(commands)))
+            elapsed = time.perf_counter() - start
+            await pipeline.close()
+            assert all(r.get("ok") for r in results), "pipeline returned errors"
+            print(f"{label:>7}: {commands / elapsed:9.0f} cmd/s  "
+                  f"({server.requests - before} requests, {serial / elapsed:.1f}x)")
+
+
+async def bench_pool(agents: int = 50, commands: int = 20, latency: float = 0.001):
+    """比較每個 agent 各自一個 client 與共用 BridgePool 的吞吐量
+
+    替身 server 跟 client 在同一個 process（搶同一把 GIL），絕對數字偏低；
+    主要看連線數、request 數與各 agent 的排隊時間是否平均。
+    """
+    async def run(label, bridges, server):
+        before_conn, before_req = server.connections, server.requests
+        start = time.perf_counter()
+        await asyncio.gather(*(b.register(name=b.agent_id) for b in bridges))
+        results = await asyncio.gather(*(
+            b.move(i % 20, i % 20) for i in range(commands) for b in bridges
+        ))
+        elapsed = time.perf_counter() - start
+        assert all(r.get("ok") for r in results), f"{label} returned errors"
+        total = agents * (commands + 1)
+        print(f"{label:>12}: {agents} agents x {commands + 1} cmds  {total / elapsed:8.0f} cmd/s  "
+              f"({server.requests - before_req} requests, "
+              f"{server.connections - before_conn} new connections)")
+
+    with StubWorldServer(latency=latency) as server:
+        bridges = [WorldBridge(server.url, f"solo-{i}") for i in range(agents)]
+        await run("per-agent", bridges, server)
+        await asyncio.gather(*(b.close() for b in bridges))
+
+        for label, pool in (
+            ("pool", BridgePool(server.url, rate=None)),
+            ("pool+batch", BridgePool(server.url, rate=None, batch=True)),
+        ):
+            await run(label, [pool.bridge(f"{label}-{i}") for i in range(agents)], server)
+            waits = [s["avg_wait_ms"] for s in pool.stats().values()]
+            print(f"{'':>12}  queue wait per agent: min {min(waits):.1f} ms, max {max(waits):.1f} ms")
+            await pool.close()
+
+
+def bench_sync(calls: int = 500, latency: float = 0.0):
+    """比較每次 asyncio.run()（舊版 sync_*）與常駐背景 loop 的單次呼叫延遲"""
+    def report(label, samples, server, before):
+        samples.sort()
+        p50 = samples[len(samples) // 2] * 1000
+        p99 = samples[int(len(samples) * 0.99)] * 1000
+        print(f"{label:>16}: p50 {p50:6.3f} ms  p99 {p99:6.3f} ms  "
+              f"({server.connections - before} new connections)")
+
+    with StubWorldServer(latency=latency) as server:
+        pool = BridgePool(server.url, rate=None)
+        bridge = pool.bridge("bench")
+        asyncio.run(bridge.register())
+
+        samples, before = [], server.connections
+        for _ in range(calls):
+            start = time.perf_counter()
+            asyncio.run(bridge.action("wave"))
+            samples.append(time.perf_counter() - start)
+        report("asyncio.run", samples, server, before)
+
+        loop = BackgroundLoop("bench-loop")
+        sync = SyncWorldBridge(bridge, loop)
+        sync.register()
+        samples, before = [], server.connections
+        for _ in range(calls):
+            start = time.perf_counter()
+            sync.action("wave")
+            samples.append(time.perf_counter() - start)
+        report("background loop", samples, server, before)
+
+        # 扣掉 HTTP 來回：同樣的 coroutine 不發 request，只量 loop 切換成本
+        async def noop():
+            return None
+        samples = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            loop.run(noop())
+            samples.append(time.perf_counter() - start)
+        report("  (overhead)", samples, server, server.connections)
+        loop.run(pool.close())
+        loop.stop()
+
+
+async def _bench_sync(n):
+    # bench_sync 自己管理 event loop，放到 thread 跑避免跟外層 asyncio.run 衝突
+    await asyncio.to_thread(bench_sync, n or 500)
+
+
+BENCHMARKS = {
+    "pipeline": lambda n: bench_pipeline(n or 2000),
+    "pool": lambda n: bench_pool(commands=n or 20),
+    "sync": _bench_sync,
+}
 
 
 if __name__ == "__main__":
     import sys
     
+    if sys.argv[1:2] == ["--bench"]:
+        # python3 nami-bridge.py --bench [pipeline|pool|sync] [count]
+        name = sys.argv[2] if len(sys.argv) > 2 else "pipeline"
+        count = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+        asyncio.run(BENCHMARKS[name](count))
+        sys.exit(0)
+    
     async def main():
         bridge = WorldBridge()
         
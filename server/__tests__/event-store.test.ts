@@ -0,0 +1,93 @@
+import { describe, it, expect, beforeEach, afterEach, vi } from "vitest";
+import { EventStore, parseEventCursor, streamEventIds } from "../event-store.js";
+import type { WorldMessage } from "../types.js";
+
+vi.mock("node:fs", () => ({
+  // data/ exists, events.jsonl does not — start empty
+  existsSync: vi.fn((path: string) => !path.endsWith(".jsonl")),
+  mkdirSync: vi.fn(),
+  readFileSync: vi.fn(),
+  writeFileSync: vi.fn(),
+}));
+
+function makeChat(agentId: string, text: string, timestamp: number): WorldMessage {
+  return { worldType: "chat", agentId, text, timestamp };
+}
+
+describe("EventStore", () => {
+  let store: EventStore;
+
+  beforeEach(() => {
+    store = new EventStore();
+  });
+
+  afterEach(() => {
+    store.close();
+  });
+
+  describe("page", () => {
+    it("returns events oldest first with hasMore", () => {
+      for (let i = 1; i <= 5; i++) store.append(makeChat("a1", `m${i}`, i));
+
+      const first = store.page(0, 0, 2);
+      expect(first.events.map(e => e.timestamp)).toEqual([1, 2]);
+      expect(first.hasMore).toBe(true);
+
+      const last = store.page(4, 1, 2);
+      expect(last.events.map(e => e.timestamp)).toEqual([5]);
+      expect(last.hasMore).toBe(false);
+    });
+
+    it("resumes inside a timestamp tie without skipping or repeating", () => {
+      store.append(makeChat("a1", "before", 10));
+      for (const text of ["t1", "t2", "t3"]) store.append(makeChat("a1", text, 20));
+      store.append(makeChat("a1", "after", 30));
+
+      const first = store.page(0, 0, 3);
+      expect(first.events.map(e => (e as { text: string }).text)).toEqual(["before", "t1", "t2"]);
+
+      // cursor: last timestamp 20, two events at 20 already consumed
+      const next = store.page(20, 2, 3);
+      expect(next.events.map(e => (e as { text: string }).text)).toEqual(["t3", "after"]);
+      expect(next.hasMore).toBe(false);
+    });
+  });
+
+  describe("stream ids", () => {
+    it("resumes from the last id inside a timestamp tie", () => {
+      store.append(makeChat("a1", "before", 10));
+      for (const text of ["t1", "t2", "t3"]) store.append(makeChat("a1", text, 20));
+
+      const nextId = streamEventIds({ afterTs: 0, skip: 0 });
+      const ids = store.page(0, 0, Infinity).events.map(nextId);
+      expect(ids).toEqual(["10:1", "20:1", "20:2", "20:3"]);
+
+      // The client saw t1 and t2, then reconnected with Last-Event-ID "20:2"
+      const cursor = parseEventCursor(ids[2])!;
+      const resumed = store.page(cursor.afterTs, cursor.skip, Infinity).events;
+      expect(resumed.map(e => (e as { text: string }).text)).toEqual(["t3"]);
+      // Ids on the resumed stream continue the count at 20
+      expect(resumed.map(streamEventIds(cursor))).toEqual(["20:3"]);
+    });
+
+    it("treats a bare timestamp id as everything after it", () => {
+      expect(parseEventCursor("20")).toEqual({ afterTs: 21, skip: 0 });
+      expect(parseEventCursor("20:2")).toEqual({ afterTs: 20, skip: 2 });
+      expect(parseEventCursor("garbage")).toBeNull();
+    });
+  });
+
+  describe("subscribe", () => {
+    it("notifies listeners until unsubscribed", () => {
+      const seen: WorldMessage[] = [];
+      const unsubscribe = store.subscribe(ev => seen.push(ev));
+
+      store.append(makeChat("a1", "one", 1));
+      unsubscribe();
+      store.append(makeChat("a1", "two", 2));
+
+      expect(seen).toHaveLength(1);
+      expect(store.query()).toHaveLength(2);
+    });
+  });
+});
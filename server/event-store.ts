@@ -11,11 +11,48 @@ const MAX_PERSISTED = 2000;
 /** Batch write interval (ms) */
 const FLUSH_INTERVAL = 30_000;
 
+/** A page() cursor: events after afterTs, plus those at afterTs beyond the first `skip` */
+export interface EventCursor {
+  afterTs: number;
+  skip: number;
+}
+
+/**
+ * Parse an SSE Last-Event-ID. Ids are "<afterTs>:<skip>" (see streamEventIds);
+ * a bare timestamp (older streams) means "everything after it".
+ */
+export function parseEventCursor(id: string): EventCursor | null {
+  const match = /^(\d+)(?::(\d+))?$/.exec(id.trim());
+  if (!match) return null;
+  if (match[2] === undefined) return { afterTs: Number(match[1]) + 1, skip: 0 };
+  return { afterTs: Number(match[1]), skip: Number(match[2]) };
+}
+
+/**
+ * SSE ids for one stream that starts at `from`: each id is the page() cursor
+ * just past its event, so a reconnect resumes inside a timestamp tie without
+ * losing or repeating events.
+ */
+export function streamEventIds(from: EventCursor): (ev: WorldMessage) => string {
+  let lastTs = from.afterTs;
+  let tied = from.skip;
+  return (ev) => {
+    if (ev.timestamp === lastTs) {
+      tied++;
+    } else {
+      lastTs = ev.timestamp;
+      tied = 1;
+    }
+    return `${lastTs}:${tied}`;
+  };
+}
+
 /**
  * Append-only event store. Keeps recent events in memory + flushes to JSONL file.
  */
 export class EventStore {
   private events: WorldMessage[] = [];
+  private listeners = new Set<(ev: WorldMessage) => void>();
   private dirty = false;
   private flushTimer: ReturnType<typeof setInterval>;
 
@@ -33,6 +70,19 @@ export class EventStore {
     if (this.events.length > MAX_PERSISTED * 1.5) {
       this.events = this.events.slice(-MAX_PERSISTED);
     }
+    for (const listener of this.listeners) {
+      try {
+        listener(ev);
+      } catch (err) {
+        console.error("[event-store] listener error:", err);
+      }
+    }
+  }
+
+  /** Subscribe to newly appended events. Returns an unsubscribe function. */
+  subscribe(listener: (ev: WorldMessage) => void): () => void {
+    this.listeners.add(listener);
+    return () => { this.listeners.delete(listener); };
   }
 
   /** Query events since timestamp */
@@ -43,6 +93,24 @@ export class EventStore {
     return filtered.slice(-limit);
   }
 
+  /**
+   * Page forward from a cursor, oldest first.
+   * The cursor (afterTs, skip) covers events newer than afterTs plus the events
+   * at exactly afterTs beyond the first `skip`, so timestamp ties that straddle
+   * a page boundary are neither skipped nor repeated.
+   */
+  page(afterTs = 0, skip = 0, limit = 50): { events: WorldMessage[]; hasMore: boolean } {
+    const events: WorldMessage[] = [];
+    let tied = 0;
+    for (const e of this.events) {
+      if (e.timestamp < afterTs) continue;
+      if (e.timestamp === afterTs && tied++ < skip) continue;
+      if (events.length === limit) return { events, hasMore: true };
+      events.push(e);
+    }
+    return { events, hasMore: false };
+  }
+
   /** Flush to disk */
   flush(): void {
     if (!this.dirty) return;
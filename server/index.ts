@@ -22,7 +22,7 @@ import { ScreenStore } from "./screen-store.js";
 import { loadRoomConfig } from "./room-config.js";
 import { createRoomInfoGetter } from "./room-info.js";
 import { handleRestRoute } from "./routes/rest.js";
-import { handleIpcCommand } from "./routes/ipc.js";
+import { handleIpcCommand, handleIpcBatch } from "./routes/ipc.js";
 import { NotificationDispatcher } from "./notification.js";
 import { TxListener } from "./tx-listener.js";
 import { SubscriptionManager } from "./ws-subscribe.js";
@@ -161,6 +161,10 @@ const server = createServer(async (req: IncomingMessage, res: ServerResponse) =>
   if (method === "POST" && (url === "/" || url === "/ipc")) {
     try {
       const parsed = await readBody(req);
+      const batch = (parsed as { batch?: unknown })?.batch;
+      if (Array.isArray(batch)) {
+        return json(res, 200, { ok: true, results: await handleIpcBatch(batch, ctx) });
+      }
       const result = await handleIpcCommand(parsed as Record<string, unknown>, ctx);
       return json(res, 200, result);
     } catch (err) {
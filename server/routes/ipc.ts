@@ -5,6 +5,31 @@ import type { WorldMessage, JoinMessage, PositionMessage, AgentSkillDeclaration,
 import { getZoneForStatus, getActionForStatus, isValidStatus } from "../status-zone.js";
 import type { Widget } from "../dashboard-store.js";
 
+/** Max commands accepted in one POST /ipc batch */
+export const MAX_IPC_BATCH = 100;
+
+/**
+ * Handle a batch of IPC commands: { batch: [{ command, args, token }, ...] }.
+ * Commands run in order; each entry gets its own result or { error }.
+ */
+export async function handleIpcBatch(
+  entries: unknown[],
+  ctx: ServerContext,
+): Promise<unknown[]> {
+  if (entries.length > MAX_IPC_BATCH) {
+    throw new Error(`Batch too large (${entries.length} > ${MAX_IPC_BATCH})`);
+  }
+  const results: unknown[] = [];
+  for (const entry of entries) {
+    try {
+      results.push(await handleIpcCommand(entry as Record<string, unknown>, ctx));
+    } catch (err) {
+      results.push({ error: String(err) });
+    }
+  }
+  return results;
+}
+
 /**
  * Handle IPC commands. Called from POST /ipc endpoint.
  */
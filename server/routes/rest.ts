@@ -4,10 +4,14 @@ import { promisify } from "node:util";
 import type { ServerContext } from "../context.js";
 import { json, readBody, PayloadTooLargeError } from "../http-utils.js";
 import { verifyTelegramAuth } from "../telegram-auth.js";
-import type { ChatMessage, WhisperMessage } from "../types.js";
+import { parseEventCursor, streamEventIds } from "../event-store.js";
+import type { ChatMessage, WhisperMessage, WorldMessage } from "../types.js";
 
 const execFile = promisify(execFileCb);
 
+/** SSE keep-alive comment interval (ms) */
+const SSE_HEARTBEAT_MS = 15_000;
+
 // ── Broadcast counter ────────────────────────────────────────
 let broadcastCount = 0;
 const serverStartedAt = new Date().toISOString();
@@ -46,11 +50,47 @@ export async function handleRestRoute(
   const url = req.url ?? "/";
   const method = req.method ?? "GET";
 
+  // ── /api/events/stream — Live events (Server-Sent Events) ─
+  // Replays everything after ?since= (or from the Last-Event-ID cursor), then
+  // pushes new events. Ids are "ts:skip" page() cursors, so a reconnect
+  // resumes inside a timestamp tie.
+  if (url.startsWith("/api/events/stream") && method === "GET") {
+    const reqUrl = new URL(req.url ?? "/", "http://localhost");
+    const lastEventId = req.headers["last-event-id"];
+    const since = Number(reqUrl.searchParams.get("since") || "0");
+    const from = (typeof lastEventId === "string" && parseEventCursor(lastEventId))
+      || { afterTs: since > 0 ? since + 1 : 0, skip: 0 };
+    res.writeHead(200, {
+      "Content-Type": "text/event-stream",
+      "Cache-Control": "no-cache",
+      "Connection": "keep-alive",
+      "Access-Control-Allow-Origin": "*",
+    });
+    const nextId = streamEventIds(from);
+    const send = (ev: WorldMessage) => res.write(`id: ${nextId(ev)}\ndata: ${JSON.stringify(ev)}\n\n`);
+    for (const ev of ctx.eventStore.page(from.afterTs, from.skip, Infinity).events) send(ev);
+    const unsubscribe = ctx.eventStore.subscribe(send);
+    const heartbeat = setInterval(() => res.write(": ping\n\n"), SSE_HEARTBEAT_MS);
+    req.on("close", () => {
+      clearInterval(heartbeat);
+      unsubscribe();
+    });
+    return true;
+  }
+
   // ── /api/events — Chat history ────────────────────────────
+  // ?since=T returns the newest `limit` events after T.
+  // ?after=T&skip=N pages forward oldest-first (see EventStore.page).
   if (url.startsWith("/api/events") && method === "GET") {
     const reqUrl = new URL(req.url ?? "/", "http://localhost");
-    const since = Number(reqUrl.searchParams.get("since") || "0");
     const limit = Math.min(Number(reqUrl.searchParams.get("limit") || "50"), 200);
+    const after = reqUrl.searchParams.get("after");
+    if (after !== null) {
+      const skip = Number(reqUrl.searchParams.get("skip") || "0");
+      json(res, 200, { ok: true, ...ctx.eventStore.page(Number(after), skip, limit) });
+      return true;
+    }
+    const since = Number(reqUrl.searchParams.get("since") || "0");
     json(res, 200, { ok: true, events: ctx.eventStore.query(since, limit) });
     return true;
   }
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Startup benchmark for `kaspa-wallet <subcommand>`.
+
+For every subcommand, spawns `kaspa-wallet <subcommand> --help` several
+times and reports the best wall time above the bare interpreter
+(`python3 -c pass`), plus the heaviest imports from `python3 -X importtime`.
+Fails (exit 1) when a subcommand exceeds its budget in startup_budget.json
+or imports a module listed there as forbidden on the --help path.
+
+Usage: python3 bench_startup.py [--runs N] [subcommand ...]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENTRY = os.path.join(HERE, "kaspa-wallet")
+BUDGET_FILE = os.path.join(HERE, "startup_budget.json")
+
+
+def best_wall_ms(argv: list, runs: int) -> float:
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def import_times(argv: list) -> dict:
+    """{module: cumulative microseconds} from -X importtime."""
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + argv,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            times[parts[2].strip()] = int(parts[1])
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="kaspa-wallet startup benchmark")
+    parser.add_argument("subcommands", nargs="*", help="Subcommands to measure (default: all in the budget)")
+    parser.add_argument("--runs", type=int, default=5, help="Spawns per subcommand (best is kept)")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE) as f:
+        budget = json.load(f)
+    subcommands = args.subcommands or [name for name in budget["help_overhead_ms"] if name != "default"]
+    forbidden = budget.get("forbidden_imports", [])
+
+    floor = best_wall_ms([sys.executable, "-c", "pass"], args.runs)
+    print(f"interpreter floor: {floor:.0f}ms\n")
+    print(f"{'subcommand':<10} {'wall':>7} {'overhead':>9} {'budget':>7}  heaviest imports")
+
+    failed = False
+    for name in subcommands:
+        wall = best_wall_ms([sys.executable, ENTRY, name, "--help"], args.runs)
+        overhead = wall - floor
+        limit = budget["help_overhead_ms"].get(name, budget["help_overhead_ms"]["default"])
+        times = import_times([ENTRY, name, "--help"])
+        banned = sorted(m for m in times if m.split(".")[0] in forbidden)
+        heaviest = sorted(times.items(), key=lambda kv: -kv[1])[:3]
+        ok = overhead <= limit and not banned
+        failed |= not ok
+        print(f"{name:<10} {wall:6.0f}ms {overhead:7.0f}ms {limit:5}ms  "
+              + ", ".join(f"{m} {us / 1000:.0f}ms" for m, us in heaviest)
+              + ("" if ok else "  ← OVER BUDGET" if not banned else f"  ← imports {', '.join(banned)}"))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,30 @@
 #!/usr/bin/env python3
-"""Check balance of a Kaspa address."""
+"""Check balance of a Kaspa address.
+
+With several addresses (or --file), balances come from the node's
+get_balances_by_addresses call, BALANCE_BATCH addresses per round trip,
+and are printed as one fleet snapshot with a total.
+
+--watch keeps a snapshot current: every --interval seconds it prints a
+{"status": "balances", ...} line, refetching only addresses whose cached
+balance expired or whose UTXOs changed (a utxos-changed subscription
+invalidates them; no UTXO sets are fetched or kept).
+
+--ndjson streams one line per address as soon as its batch returns, then
+a summary line, instead of assembling the snapshot first (with --watch,
+every snapshot is streamed that way).
+"""
 
 import argparse
 import asyncio
 import json
-from kaspa import RpcClient, Resolver
+import time
+from wallet_daemon import connect_rpc
+
+
+BALANCE_BATCH = 1000  # addresses per get_balances_by_addresses call
+BALANCE_TTL = 300  # seconds a cached balance is served; watcher activity invalidates it sooner
+SNAPSHOT_INTERVAL = 60  # seconds between --watch snapshots
 
 
 async def check_balance(address: str, network: str = "mainnet") -> dict:
@@ -17,8 +37,7 @@ async def check_balance(address: str, network: str = "mainnet") -> dict:
     Returns:
         dict with balance info
     """
-    client = RpcClient(resolver=Resolver(), network_id=network)
-    await client.connect()
+    client = await connect_rpc(network)
     
     try:
         result = await client.get_balance_by_address({"address": address})
@@ -34,9 +53,210 @@ async def check_balance(address: str, network: str = "mainnet") -> dict:
         await client.disconnect()
 
 
+class BalanceCache:
+    """In-process balances (sompi) with a TTL.
+
+    invalidate() drops addresses with UTXO activity so the next snapshot
+    refetches just those. An invalidation can race a fetch already in
+    flight for the same address, so fetches record the generation they
+    started at and put_many() skips addresses invalidated since.
+    """
+
+    def __init__(self, ttl: float = BALANCE_TTL):
+        self.ttl = ttl
+        self.entries = {}  # address -> (balance, fetched_at)
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0  # bumped by every invalidate()
+        self.invalidated = {}  # address -> generation of its last invalidation
+        self.cleared = 0  # generation of the last invalidate(None)
+
+    def get_many(self, addresses: list) -> tuple[dict, list]:
+        """(cached balances, addresses to fetch)"""
+        now = time.monotonic()
+        fresh, missing = {}, []
+        for address in addresses:
+            cached = self.entries.get(address)
+            if cached is not None and now - cached[1] < self.ttl:
+                fresh[address] = cached[0]
+            else:
+                missing.append(address)
+        self.hits += len(fresh)
+        self.misses += len(missing)
+        return fresh, missing
+
+    def put_many(self, balances: dict, started: int | None = None):
+        """Cache fetched balances; started is the generation when the fetch
+        began (addresses invalidated after it are left uncached)."""
+        now = time.monotonic()
+        for address, balance in balances.items():
+            if started is not None and max(self.cleared, self.invalidated.get(address, 0)) > started:
+                continue  # changed while the fetch was in flight: the balance may be stale
+            self.entries[address] = (balance, now)
+
+    def invalidate(self, addresses=None):
+        """Forget the given addresses (all when None)."""
+        self.generation += 1
+        if addresses is None:
+            self.entries.clear()
+            self.invalidated.clear()
+            self.cleared = self.generation
+            return
+        for address in addresses:
+            self.entries.pop(address, None)
+            self.invalidated[address] = self.generation
+
+
+async def _fetch_batch(client, batch: list) -> dict:
+    result = await client.get_balances_by_addresses({"addresses": batch})
+    balances = dict.fromkeys(batch, 0)
+    balances.update((str(e["address"]), e.get("balance") or 0) for e in result.get("entries", []))
+    return balances
+
+
+def _batches(addresses: list, batch_size: int) -> list:
+    return [addresses[i:i + batch_size] for i in range(0, len(addresses), batch_size)]
+
+
+def _balance_entry(address: str, balance: int) -> dict:
+    return {"address": address, "balance_sompi": balance, "balance_kas": balance / 100_000_000}
+
+
+async def fetch_balances(client, addresses: list, batch_size: int = BALANCE_BATCH) -> dict:
+    """Balances (sompi) of addresses; batches of batch_size run concurrently.
+
+    Addresses the node does not list have no UTXOs and a balance of 0.
+    """
+    balances = {}
+    for found in await asyncio.gather(*(_fetch_batch(client, b) for b in _batches(addresses, batch_size))):
+        balances.update(found)
+    return balances
+
+
+async def balance_snapshot(client, addresses: list, cache: BalanceCache | None = None) -> dict:
+    """Balances and total for addresses, fetching only what the cache lacks."""
+    started = time.perf_counter()
+    fresh, missing = cache.get_many(addresses) if cache is not None else ({}, list(addresses))
+    generation = cache.generation if cache is not None else 0
+    fetched = await fetch_balances(client, missing) if missing else {}
+    if cache is not None:
+        cache.put_many(fetched, generation)
+    balances = {**fresh, **fetched}
+    total = sum(balances.values())
+    return {
+        "status": "balances",
+        "addresses": [_balance_entry(a, balances[a]) for a in addresses],
+        "total_sompi": total,
+        "total_kas": total / 100_000_000,
+        "cached": len(fresh),
+        "fetched": len(fetched),
+        "round_trips": -(-len(missing) // BALANCE_BATCH),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+async def stream_balances(client, addresses: list, cache: BalanceCache | None = None,
+                          batch_size: int = BALANCE_BATCH):
+    """balance_snapshot() as an async generator.
+
+    Yields one {"address", "balance_sompi", "balance_kas"} dict per address,
+    cached ones first, then each batch as soon as its call returns, and a
+    closing {"status": "balances", ...} summary without the address list.
+    """
+    started = time.perf_counter()
+    fresh, missing = cache.get_many(addresses) if cache is not None else ({}, list(addresses))
+    generation = cache.generation if cache is not None else 0
+    total = 0
+    for address, balance in fresh.items():
+        total += balance
+        yield _balance_entry(address, balance)
+    batches = _batches(missing, batch_size)
+    for done in asyncio.as_completed([_fetch_batch(client, b) for b in batches]):
+        found = await done
+        if cache is not None:
+            cache.put_many(found, generation)
+        for address, balance in found.items():
+            total += balance
+            yield _balance_entry(address, balance)
+    yield {
+        "status": "balances",
+        "total_sompi": total,
+        "total_kas": total / 100_000_000,
+        "cached": len(fresh),
+        "fetched": len(missing),
+        "round_trips": len(batches),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+async def check_balances(addresses: list, network: str = "mainnet") -> dict:
+    """One fleet snapshot over a (daemon or direct) connection."""
+    client = await connect_rpc(network)
+    try:
+        return await balance_snapshot(client, addresses)
+    finally:
+        await client.disconnect()
+
+
+async def emit_balances(addresses: list, network: str = "mainnet"):
+    """Print stream_balances() as NDJSON over a (daemon or direct) connection."""
+    from ndjson import aemit_all
+
+    client = await connect_rpc(network)
+    try:
+        await aemit_all(stream_balances(client, addresses))
+    finally:
+        await client.disconnect()
+
+
+def changed_addresses(event: dict) -> set:
+    """Addresses a utxos-changed notification touched."""
+    data = event.get("data", event)
+    return {str(e.get("address", "")) for key in ("added", "removed") for e in data.get(key, [])}
+
+
+async def watch_balances(addresses: list, network: str = "mainnet", interval: float = SNAPSHOT_INTERVAL,
+                         ttl: float = BALANCE_TTL, ndjson: bool = False):
+    """Print a snapshot every interval; UTXO notifications invalidate cached balances.
+
+    With ndjson, each snapshot is streamed as per-address lines and a summary.
+    """
+    from kaspa import RpcClient, Resolver
+    from listen_messages import kaspa_address
+    from ndjson import aemit_all, emit
+
+    # Notifications need a direct connection (the daemon only forwards calls)
+    client = RpcClient(resolver=Resolver(), network_id=network)
+    cache = BalanceCache(ttl)
+    loop = asyncio.get_running_loop()
+    reconnected = asyncio.Event()
+
+    # The client may call back from its own thread
+    client.add_event_listener(
+        "utxos-changed", lambda event: loop.call_soon_threadsafe(cache.invalidate, changed_addresses(event)))
+    await client.connect()
+    try:
+        await client.subscribe_utxos_changed([kaspa_address(a) for a in addresses])
+        # The subscription does not survive a reconnect, and changes in between were missed
+        client.add_event_listener("connect", lambda _event: loop.call_soon_threadsafe(reconnected.set))
+        while True:
+            if reconnected.is_set():
+                reconnected.clear()
+                cache.invalidate()
+                await client.subscribe_utxos_changed([kaspa_address(a) for a in addresses])
+            if ndjson:
+                await aemit_all(stream_balances(client, addresses, cache))
+            else:
+                emit(await balance_snapshot(client, addresses, cache))
+            await asyncio.sleep(interval)
+    finally:
+        await client.disconnect()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Check Kaspa address balance")
-    parser.add_argument("address", help="Kaspa address to check")
+    parser.add_argument("addresses", nargs="*", metavar="address", help="Kaspa address(es) to check")
+    parser.add_argument("--file", help="File with one address per line")
     parser.add_argument(
         "--network",
         choices=["mainnet", "testnet"],
@@ -48,9 +268,45 @@ def main():
         action="store_true",
         help="Output as JSON"
     )
+    parser.add_argument("--ndjson", action="store_true",
+                        help="Stream one compact JSON line per address as its batch returns, then a summary")
+    parser.add_argument("--watch", action="store_true",
+                        help="Print a JSON snapshot every --interval seconds, refetching only changed addresses")
+    parser.add_argument("--interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help=f"Seconds between --watch snapshots (default: {SNAPSHOT_INTERVAL})")
     args = parser.parse_args()
-    
-    result = asyncio.run(check_balance(args.address, args.network))
+
+    addresses = list(args.addresses)
+    if args.file:
+        with open(args.file) as f:
+            addresses += [line.strip() for line in f if line.strip()]
+    addresses = list(dict.fromkeys(addresses))
+    if not addresses:
+        parser.error("no addresses given")
+
+    if args.watch:
+        try:
+            asyncio.run(watch_balances(addresses, args.network, args.interval, ndjson=args.ndjson))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.ndjson:
+        asyncio.run(emit_balances(addresses, args.network))
+        return
+
+    if len(addresses) > 1:
+        snapshot = asyncio.run(check_balances(addresses, args.network))
+        if args.json:
+            print(json.dumps(snapshot, indent=2))
+        else:
+            for entry in snapshot["addresses"]:
+                print(f"💰 {entry['address']}: {entry['balance_kas']} KAS")
+            print(f"   Total: {snapshot['total_kas']} KAS across {len(addresses)} addresses "
+                  f"({snapshot['round_trips']} round trip(s), {snapshot['elapsed_ms']}ms)")
+        return
+
+    result = asyncio.run(check_balance(addresses[0], args.network))
     
     if args.json:
         print(json.dumps(result, indent=2))
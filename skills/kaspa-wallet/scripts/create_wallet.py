@@ -1,9 +1,33 @@
 #!/usr/bin/env python3
-"""Generate a new Kaspa wallet with mnemonic, address, and private key."""
+"""Generate a new Kaspa wallet with mnemonic, address, and private key.
+
+Batch modes stream compact JSON lines and spread the work over a process
+pool (--ndjson also flushes every derived address as it arrives):
+
+    create_wallet.py --count 100                 # 100 independent wallets
+    create_wallet.py --derive 10000 --change     # receive + change addresses of a new wallet
+    create_wallet.py --derive 10000 --mnemonic-file .secrets/my-wallet.json --no-keys
+    create_wallet.py --bench [--derive 20000]    # addresses/sec per core
+"""
 
 import argparse
 import json
-from kaspa import Mnemonic, XPrv, PrivateKeyGenerator
+import multiprocessing
+import os
+import sys
+import time
+
+from ndjson import emit, emit_all
+
+
+DERIVE_CHUNK = 500  # addresses per pool task
+
+
+def _key_generator(xprv_str: str):
+    from kaspa import PrivateKeyGenerator
+
+    # Account 0, like create_wallet()
+    return PrivateKeyGenerator(xprv_str, False, 0)
 
 
 def create_wallet(network: str = "mainnet") -> dict:
@@ -15,6 +39,8 @@ def create_wallet(network: str = "mainnet") -> dict:
     Returns:
         dict with mnemonic, address, and private_key
     """
+    from kaspa import Mnemonic, XPrv
+
     # Generate 24-word mnemonic
     mnemonic = Mnemonic.random()
     
@@ -24,7 +50,7 @@ def create_wallet(network: str = "mainnet") -> dict:
     xprv_str = xprv.to_string()
     
     # Create key generator (account 0)
-    key_gen = PrivateKeyGenerator(xprv_str, False, 0)
+    key_gen = _key_generator(xprv_str)
     
     # Get first receive address
     private_key = key_gen.receive_key(0)
@@ -38,6 +64,110 @@ def create_wallet(network: str = "mainnet") -> dict:
     }
 
 
+def xprv_from_mnemonic(phrase: str) -> str:
+    from kaspa import Mnemonic, XPrv
+
+    return XPrv(Mnemonic(phrase).to_seed()).to_string()
+
+
+def derive_addresses(key_gen, network: str, start: int, count: int, change: bool = False,
+                     keys: bool = True) -> list[dict]:
+    """Addresses start..start+count-1 of the receive (or change) chain."""
+    derive = key_gen.change_key if change else key_gen.receive_key
+    records = []
+    for index in range(start, start + count):
+        private_key = derive(index)
+        record = {"index": index, "change": change, "address": private_key.to_address(network).to_string()}
+        if keys:
+            record["private_key"] = private_key.to_string()
+        records.append(record)
+    return records
+
+
+# Per-process state of the derivation pool: the key generator is built once
+# per worker, not per task
+_worker = {}
+
+
+def _init_worker(xprv_str: str, network: str, keys: bool):
+    _worker.update(key_gen=_key_generator(xprv_str), network=network, keys=keys)
+
+
+def _derive_task(task: tuple) -> list[dict]:
+    start, count, change = task
+    return derive_addresses(_worker["key_gen"], _worker["network"], start, count, change, _worker["keys"])
+
+
+def _create_task(network: str) -> dict:
+    return create_wallet(network)
+
+
+def _pool(workers: int, **kwargs):
+    # spawn: workers start clean instead of inheriting the parent's state
+    return multiprocessing.get_context("spawn").Pool(workers, **kwargs)
+
+
+def derive_batch(xprv_str: str, count: int, network: str = "mainnet", start: int = 0,
+                 change: bool = False, keys: bool = True, workers: int | None = None):
+    """Yield count receive addresses (and count change addresses with change=True)
+    in index order, derived in DERIVE_CHUNK-sized tasks across a process pool."""
+    workers = workers or os.cpu_count() or 1
+    tasks = [(i, min(DERIVE_CHUNK, start + count - i), chain)
+             for chain in ([False, True] if change else [False])
+             for i in range(start, start + count, DERIVE_CHUNK)]
+    if workers == 1:
+        key_gen = _key_generator(xprv_str)
+        for i, n, chain in tasks:
+            yield from derive_addresses(key_gen, network, i, n, chain, keys)
+        return
+    with _pool(workers, initializer=_init_worker, initargs=(xprv_str, network, keys)) as pool:
+        for records in pool.imap(_derive_task, tasks):
+            yield from records
+
+
+def create_wallets(count: int, network: str = "mainnet", workers: int | None = None):
+    """Yield count independent wallets generated across a process pool."""
+    workers = min(workers or os.cpu_count() or 1, count)
+    if workers <= 1:
+        for _ in range(count):
+            yield create_wallet(network)
+        return
+    with _pool(workers) as pool:
+        yield from pool.imap_unordered(_create_task, [network] * count, chunksize=max(1, count // (workers * 4)))
+
+
+def read_mnemonic(path: str) -> str:
+    """Mnemonic from a secrets JSON file ("mnemonic") or a plain-text file."""
+    with open(path) as f:
+        text = f.read().strip()
+    if text.startswith("{"):
+        return json.loads(text)["mnemonic"]
+    return text
+
+
+def bench(count: int = 20000, network: str = "mainnet", spawns: int = 5):
+    """Addresses/sec for 1, 2, 4 ... cpu_count workers, against one script run per address."""
+    import subprocess
+
+    started = time.perf_counter()
+    for _ in range(spawns):
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--json", "--network", network],
+                       stdout=subprocess.DEVNULL, check=True)
+    per_spawn = (time.perf_counter() - started) / spawns
+
+    xprv_str = xprv_from_mnemonic(create_wallet(network)["mnemonic"])
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, cores} | {2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores})
+    print(f"Deriving {count} receive addresses (with private keys), {cores} cores")
+    print(f"{'workers':>8} {'seconds':>9} {'addr/s':>10} {'addr/s/core':>12}")
+    print(f"{'spawn':>8} {per_spawn:>9.2f} {1 / per_spawn:>10.1f} {1 / per_spawn:>12.1f}  (one script run per address)")
+    for workers in worker_counts:
+        started = time.perf_counter()
+        derived = sum(1 for _ in derive_batch(xprv_str, count, network, workers=workers))
+        elapsed = time.perf_counter() - started
+        print(f"{workers:>8} {elapsed:>9.2f} {derived / elapsed:>10.0f} {derived / elapsed / workers:>12.0f}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate a new Kaspa wallet")
     parser.add_argument(
@@ -51,11 +181,46 @@ def main():
         action="store_true",
         help="Output as JSON"
     )
+    parser.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="Compact JSON lines, flushed per record (batch modes buffer output otherwise)"
+    )
+    parser.add_argument("--count", type=int, help="Generate N wallets (JSON lines)")
+    parser.add_argument("--derive", type=int, metavar="N",
+                        help="Derive N receive addresses of one wallet (JSON lines)")
+    parser.add_argument("--mnemonic-file", help="Derive from this wallet (secrets JSON or plain phrase) "
+                                                "instead of a new one")
+    parser.add_argument("--start", type=int, default=0, help="First address index (default: 0)")
+    parser.add_argument("--change", action="store_true", help="Also derive N change addresses")
+    parser.add_argument("--no-keys", action="store_true", help="Omit private keys (watch-only output)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--bench", action="store_true", help="Benchmark addresses/sec per core")
     args = parser.parse_args()
-    
+
+    if args.bench:
+        bench(args.derive or 20000, args.network)
+        return
+    if args.count:
+        emit_all(create_wallets(args.count, args.network, args.workers))
+        return
+    if args.derive:
+        if args.mnemonic_file:
+            phrase = read_mnemonic(args.mnemonic_file)
+        else:
+            wallet = create_wallet(args.network)
+            phrase = wallet["mnemonic"]
+            emit(wallet)
+        records = derive_batch(xprv_from_mnemonic(phrase), args.derive, args.network, args.start,
+                               args.change, not args.no_keys, args.workers)
+        emit_all(records, flush=args.ndjson)
+        return
+
     wallet = create_wallet(args.network)
     
-    if args.json:
+    if args.ndjson:
+        emit(wallet)
+    elif args.json:
         print(json.dumps(wallet, indent=2))
     else:
         print("=" * 60)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Transaction mass and fee estimation.
+
+Kaspa charges fees per gram of mass. A transaction's mass is the larger of
+its compute mass (serialized size, script bytes and signature operations)
+and its KIP-9 storage mass (which penalizes small outputs). The node's
+get_fee_estimate returns feerate buckets (sompi/gram) with the expected
+time to inclusion; FeeEstimator picks the cheapest bucket that meets a
+latency target and caches the buckets for FEE_ESTIMATE_TTL seconds, in
+memory and in FEE_CACHE_FILE so short-lived scripts share one lookup.
+
+Usage: python3 fees.py [--network mainnet|testnet] [--json | --ndjson]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+
+
+# Mass parameters (rusty-kaspa consensus defaults)
+MASS_PER_TX_BYTE = 1
+MASS_PER_SCRIPT_PUB_KEY_BYTE = 10
+MASS_PER_SIG_OP = 1000
+STORAGE_MASS_PARAMETER = 10**12  # KIP-9 C (SOMPI_PER_KAS * 10,000)
+MAX_TX_MASS = 100_000  # standard transaction mass limit
+
+# Serialized sizes (bytes) of a P2PK Schnorr transaction
+TX_BASE_SIZE = 94  # version, counts, lock time, subnetwork, gas, payload hash and length
+INPUT_SIZE = 119  # outpoint 36 + signature script 8+66 + sequence 8 + sig op count 1
+OUTPUT_SIZE = 52  # value 8 + script version 2 + script length 8 + script 34
+SCRIPT_PUB_KEY_SIZE = 36  # script version 2 + script 34
+
+MIN_FEERATE = 1.0  # sompi per gram, the node's minimum relay feerate
+FEE_ESTIMATE_TTL = 10  # seconds
+FEE_CACHE_FILE = os.path.expanduser("~/.cache/kaspa-wallet/fee_estimate.json")
+
+
+def compute_mass(n_inputs: int, n_outputs: int, payload_len: int = 0) -> int:
+    """Compute mass of a P2PK transaction with one sig op per input."""
+    size = TX_BASE_SIZE + payload_len + n_inputs * INPUT_SIZE + n_outputs * OUTPUT_SIZE
+    return (size * MASS_PER_TX_BYTE
+            + n_outputs * SCRIPT_PUB_KEY_SIZE * MASS_PER_SCRIPT_PUB_KEY_BYTE
+            + n_inputs * MASS_PER_SIG_OP)
+
+
+def storage_mass(inputs: list[int], outputs: list[int]) -> int:
+    """KIP-9 storage mass of input/output amounts (sompi).
+
+    Small outputs are expensive. One input, one output or 2-to-2
+    transactions are relieved by the harmonic sum of the inputs, others by
+    their arithmetic mean.
+    """
+    harmonic_outputs = sum(STORAGE_MASS_PARAMETER // amount for amount in outputs)
+    if len(inputs) == 1 or len(outputs) == 1 or len(inputs) == len(outputs) == 2:
+        relief = sum(STORAGE_MASS_PARAMETER // amount for amount in inputs)
+    else:
+        relief = len(inputs) * (STORAGE_MASS_PARAMETER // (sum(inputs) // len(inputs)))
+    return max(0, harmonic_outputs - relief)
+
+
+def transaction_mass(inputs: list[int], outputs: list[int], payload_len: int = 0) -> int:
+    """Mass the node charges for: max(compute mass, storage mass)."""
+    return max(compute_mass(len(inputs), len(outputs), payload_len), storage_mass(inputs, outputs))
+
+
+def fee_for(mass: int, feerate: float = MIN_FEERATE) -> int:
+    """Fee in sompi for mass grams at feerate sompi/gram."""
+    return math.ceil(mass * max(feerate, MIN_FEERATE))
+
+
+def parse_buckets(estimate: dict) -> list[tuple[float, float]]:
+    """[(feerate, estimated seconds)] from a get_fee_estimate response, fastest first."""
+    estimate = estimate.get("estimate", estimate)
+    buckets = [estimate.get("priorityBucket")] + estimate.get("normalBuckets", []) + estimate.get("lowBuckets", [])
+    return [(b["feerate"], b["estimatedSeconds"]) for b in buckets if b]
+
+
+def pick_feerate(buckets: list[tuple[float, float]], confirm_within: float | None = None) -> float:
+    """Cheapest feerate expected to confirm within confirm_within seconds.
+
+    Without a target, the first normal bucket. If no bucket is fast
+    enough, the priority bucket.
+    """
+    if not buckets:
+        return MIN_FEERATE
+    if confirm_within is None:
+        feerate = buckets[1][0] if len(buckets) > 1 else buckets[0][0]
+    else:
+        fast_enough = [feerate for feerate, seconds in buckets if seconds <= confirm_within]
+        feerate = min(fast_enough) if fast_enough else max(feerate for feerate, _ in buckets)
+    return max(feerate, MIN_FEERATE)
+
+
+class FeeEstimator:
+    """Fee estimate from the node, cached for ttl seconds.
+
+    The cache is kept in memory and in cache_file (per network), so
+    consecutive script runs reuse one get_fee_estimate call. A failed
+    lookup falls back to the stale cache, then to MIN_FEERATE.
+    """
+
+    def __init__(self, rpc, network: str = "mainnet", ttl: float = FEE_ESTIMATE_TTL,
+                 cache_file: str | None = FEE_CACHE_FILE):
+        self.rpc = rpc
+        self.network = network
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self.lookups = 0
+        self._buckets = None
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _read_cache(self):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file) as f:
+                cached = json.load(f).get(self.network)
+        except (OSError, ValueError):
+            return
+        if cached and cached["fetched_at"] > self._fetched_at:
+            self._buckets = [tuple(b) for b in cached["buckets"]]
+            self._fetched_at = cached["fetched_at"]
+
+    def _write_cache(self):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[self.network] = {"fetched_at": self._fetched_at, "buckets": self._buckets}
+        os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+        tmp = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.cache_file)
+
+    async def buckets(self) -> list[tuple[float, float]]:
+        async with self._lock:
+            if time.time() - self._fetched_at > self.ttl:
+                self._read_cache()
+            if time.time() - self._fetched_at > self.ttl:
+                try:
+                    self.lookups += 1
+                    self._buckets = parse_buckets(await self.rpc.get_fee_estimate(request={}))
+                    self._fetched_at = time.time()
+                    self._write_cache()
+                except Exception:
+                    # Keep the stale buckets (or MIN_FEERATE) and retry after ttl
+                    self._fetched_at = time.time()
+            return self._buckets or []
+
+    async def feerate(self, confirm_within: float | None = None) -> float:
+        return pick_feerate(await self.buckets(), confirm_within)
+
+    async def fee(self, mass: int, confirm_within: float | None = None) -> int:
+        return fee_for(mass, await self.feerate(confirm_within))
+
+
+async def show_estimate(network: str) -> dict:
+    from wallet_daemon import connect_rpc
+
+    client = await connect_rpc(network)
+    try:
+        buckets = await FeeEstimator(client, network).buckets()
+    finally:
+        await client.disconnect()
+    return {
+        "network": network,
+        "buckets": [{"feerate": feerate, "estimated_seconds": seconds} for feerate, seconds in buckets],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the node's fee estimate")
+    parser.add_argument("--network", choices=["mainnet", "testnet"], default="mainnet",
+                        help="Network type (default: mainnet)")
+    parser.add_argument("--json", action="store_true", help="Output as JSON")
+    parser.add_argument("--ndjson", action="store_true", help="One compact JSON line per bucket")
+    args = parser.parse_args()
+
+    result = asyncio.run(show_estimate(args.network))
+    if args.ndjson:
+        from ndjson import emit_all
+
+        emit_all({"network": args.network, **bucket} for bucket in result["buckets"])
+        return
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"Fee estimate ({args.network}):")
+    for bucket in result["buckets"]:
+        fee = fee_for(compute_mass(1, 2), bucket["feerate"])
+        print(f"  {bucket['feerate']:>8g} sompi/gram  ~{bucket['estimated_seconds']:.1f}s  "
+              f"(1-in/2-out transfer: {fee} sompi)")
+
+
+if __name__ == "__main__":
+    main()
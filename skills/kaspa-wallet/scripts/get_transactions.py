@@ -1,25 +1,237 @@
 #!/usr/bin/env python3
-"""Get transaction history for a Kaspa address, including sender info."""
+"""Get transaction history for a Kaspa address, including sender info.
+
+Explorer lookups run on one pooled async HTTP client: transaction ids are
+de-duplicated, fetched in bulk through /transactions/search where the
+explorer supports it, and otherwise one by one with bounded concurrency.
+Failed requests are retried with exponential backoff.
+
+Fetched transactions are kept in a local SQLite cache (TX_CACHE_FILE), so
+repeat queries skip the explorer and still work while it is unreachable.
+Accepted transactions never change and are served from the cache until
+evicted (least recently used first); unaccepted ones are re-fetched.
+
+`--ndjson` streams one line per transaction, STREAM_CHUNK lookups at a
+time, instead of building the whole history first.
+
+`--bench [count]` enriches synthetic UTXOs against a local stub explorer."""
 
 import argparse
 import asyncio
 import json
-import urllib.request
-from kaspa import RpcClient, Resolver
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+from wallet_daemon import connect_rpc
 
 
 KASPA_API = "https://api.kaspa.org"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; KaspaWallet/1.0)",
+    "Accept": "application/json",
+}
+MAX_CONCURRENCY = 16  # explorer requests in flight
+SEARCH_BATCH = 250  # transaction ids per /transactions/search request
+STREAM_CHUNK = SEARCH_BATCH  # UTXOs looked up per chunk with --ndjson
+RETRIES = 3  # retries per request after the first attempt
+BACKOFF = 0.5  # seconds, doubled on every retry
+TX_CACHE_FILE = os.path.expanduser("~/.cache/kaspa-wallet/transactions.sqlite3")
+TX_CACHE_MAX_ENTRIES = 200_000  # least recently used transactions are evicted past this
+
+
+class TxCache:
+    """Persistent transaction cache keyed by tx id (SQLite).
+
+    Only the fields the scripts use are stored: block_time, is_accepted and
+    the output addresses the sender is derived from. get_many() splits hits
+    into fresh (accepted, final) and stale (unaccepted, to be re-checked but
+    still usable when the explorer is down).
+    """
+
+    def __init__(self, path: str = TX_CACHE_FILE, max_entries: int = TX_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS transactions (
+            tx_id TEXT PRIMARY KEY,
+            block_time INTEGER,
+            is_accepted INTEGER NOT NULL,
+            outputs TEXT NOT NULL,
+            used_at REAL NOT NULL
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS transactions_used_at ON transactions (used_at)")
+
+    @staticmethod
+    def _row_to_tx(tx_id, block_time, is_accepted, outputs) -> dict:
+        return {
+            "transaction_id": tx_id,
+            "block_time": block_time,
+            "is_accepted": bool(is_accepted),
+            "outputs": [{"script_public_key_address": addr} for addr in json.loads(outputs)],
+        }
+
+    def get_many(self, tx_ids: list) -> tuple[dict, dict]:
+        """Returns (fresh, stale) dicts of cached transactions."""
+        fresh, stale = {}, {}
+        for i in range(0, len(tx_ids), 500):
+            chunk = tx_ids[i:i + 500]
+            rows = self.db.execute(
+                "SELECT tx_id, block_time, is_accepted, outputs FROM transactions "
+                f"WHERE tx_id IN ({','.join('?' * len(chunk))})", chunk)
+            for row in rows:
+                (fresh if row[2] else stale)[row[0]] = self._row_to_tx(*row)
+        if fresh:
+            with self.db:
+                self.db.executemany("UPDATE transactions SET used_at = ? WHERE tx_id = ?",
+                                    [(time.time(), tx_id) for tx_id in fresh])
+        self.hits += len(fresh)
+        return fresh, stale
+
+    def put_many(self, txs: list):
+        if not txs:
+            return
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?)",
+                [(tx["transaction_id"], tx.get("block_time"), int(bool(tx.get("is_accepted"))),
+                  json.dumps([o.get("script_public_key_address", "") for o in tx.get("outputs", [])]), now)
+                 for tx in txs if tx.get("transaction_id")])
+            self.evict()
+
+    def evict(self):
+        (count,) = self.db.execute("SELECT COUNT(*) FROM transactions").fetchone()
+        if count > self.max_entries:
+            self.db.execute(
+                "DELETE FROM transactions WHERE tx_id IN "
+                "(SELECT tx_id FROM transactions ORDER BY used_at LIMIT ?)", (count - self.max_entries,))
+
+    def close(self):
+        self.db.close()
+
+
+class ExplorerClient:
+    """Async Kaspa explorer client with pooling, retries and bulk lookup.
+
+    Transactions are cached for the lifetime of the client, so a tx that
+    funded several UTXOs is fetched once, and in tx_cache across runs.
+    With offline=True only tx_cache is consulted.
+
+        async with ExplorerClient() as explorer:
+            txs = await explorer.fetch_many(tx_ids)
+    """
+
+    def __init__(self, base_url: str = KASPA_API, concurrency: int = MAX_CONCURRENCY,
+                 retries: int = RETRIES, timeout: float = 30,
+                 tx_cache: TxCache | None = None, offline: bool = False):
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.tx_cache = tx_cache
+        self.offline = offline
+        self.bulk = True  # cleared if the explorer has no /transactions/search
+        self.cache = {}
+        self.requests = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url, headers=HEADERS, timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs) -> "httpx.Response":
+        """Send a request, retrying transport errors, 429 and 5xx with backoff."""
+        import httpx
 
+        for attempt in range(self.retries + 1):
+            async with self._semaphore:
+                self.requests += 1
+                try:
+                    resp = await self._client.request(method, path, **kwargs)
+                except httpx.TransportError:
+                    if attempt == self.retries:
+                        raise
+                    resp = None
+            if resp is not None and resp.status_code != 429 and resp.status_code < 500:
+                return resp
+            if attempt == self.retries:
+                resp.raise_for_status()
+            delay = BACKOFF * 2 ** attempt * (1 + random.random() / 2)
+            if resp is not None and resp.headers.get("Retry-After", "").isdigit():
+                delay = max(delay, int(resp.headers["Retry-After"]))
+            await asyncio.sleep(delay)
 
-def fetch_transaction(tx_id: str) -> dict:
-    """Fetch transaction details from Kaspa block explorer API."""
-    url = f"{KASPA_API}/transactions/{tx_id}"
-    req = urllib.request.Request(url, headers={
-        "User-Agent": "Mozilla/5.0 (compatible; KaspaWallet/1.0)",
-        "Accept": "application/json",
-    })
-    with urllib.request.urlopen(req, timeout=30) as response:
-        return json.loads(response.read().decode())
+    async def fetch(self, tx_id: str) -> dict:
+        """Fetch one transaction."""
+        if tx_id not in self.cache:
+            resp = await self._request("GET", f"/transactions/{tx_id}")
+            resp.raise_for_status()
+            self.cache[tx_id] = resp.json()
+        return self.cache[tx_id]
+
+    async def search(self, tx_ids: list) -> dict:
+        """Bulk lookup; returns {tx_id: tx} for the ids the explorer found."""
+        resp = await self._request("POST", "/transactions/search", json={"transactionIds": tx_ids})
+        if resp.status_code in (404, 405):
+            self.bulk = False
+            return {}
+        resp.raise_for_status()
+        found = {tx["transaction_id"]: tx for tx in resp.json() if tx.get("transaction_id")}
+        self.cache.update(found)
+        return found
+
+    async def fetch_many(self, tx_ids: list) -> dict:
+        """Fetch several transactions; returns {tx_id: tx or Exception}."""
+        wanted = [tx_id for tx_id in dict.fromkeys(tx_ids) if tx_id not in self.cache]
+        results, stale = {}, {}
+
+        if self.tx_cache and wanted:
+            fresh, stale = self.tx_cache.get_many(wanted)
+            self.cache.update(fresh)
+            wanted = [tx_id for tx_id in wanted if tx_id not in fresh]
+        if self.offline:
+            for tx_id in wanted:
+                results[tx_id] = stale.get(tx_id) or LookupError(f"{tx_id} is not cached")
+            wanted = []
+        requested = list(wanted)
+
+        if self.bulk and len(wanted) > 1:
+            batches = [wanted[i:i + SEARCH_BATCH] for i in range(0, len(wanted), SEARCH_BATCH)]
+            for batch, found in zip(batches, await asyncio.gather(
+                    *(self.search(b) for b in batches), return_exceptions=True)):
+                if isinstance(found, Exception):
+                    results.update(dict.fromkeys(batch, found))
+            # Ids the search did not return (or could not) are fetched one by one
+            wanted = [tx_id for tx_id in wanted if tx_id not in self.cache]
+
+        fetched = await asyncio.gather(*(self.fetch(tx_id) for tx_id in wanted), return_exceptions=True)
+        results.update(zip(wanted, fetched))
+        if self.tx_cache:
+            self.tx_cache.put_many([self.cache[tx_id] for tx_id in requested if tx_id in self.cache])
+        for tx_id, tx in stale.items():
+            # The explorer could not be reached: the cached copy is better than nothing
+            if isinstance(results.get(tx_id), Exception):
+                results[tx_id] = tx
+        for tx_id in tx_ids:
+            if tx_id in self.cache:
+                results[tx_id] = self.cache[tx_id]
+        return results
 
 
 def find_sender_address(tx_data: dict, my_address: str) -> str | None:
@@ -31,59 +243,245 @@ def find_sender_address(tx_data: dict, my_address: str) -> str | None:
     return None
 
 
-async def get_transactions(address: str, network: str = "mainnet") -> list[dict]:
+def transaction_info(entry: dict, tx_data, address: str) -> dict:
+    """Transaction info dict for one UTXO entry and its explorer lookup
+    (a transaction, or the Exception that lookup failed with)."""
+    tx_id = entry["outpoint"]["transactionId"]
+    amount_sompi = entry["utxoEntry"]["amount"]
+    amount_kas = amount_sompi / 100_000_000
+
+    if isinstance(tx_data, Exception):
+        return {
+            "tx_id": tx_id,
+            "amount_kas": amount_kas,
+            "amount_sompi": amount_sompi,
+            "sender": None,
+            "error": str(tx_data),
+        }
+    return {
+        "tx_id": tx_id,
+        "amount_kas": amount_kas,
+        "amount_sompi": amount_sompi,
+        "sender": find_sender_address(tx_data, address),
+        "block_time": tx_data.get("block_time"),
+        "is_accepted": tx_data.get("is_accepted", False),
+    }
+
+
+async def enrich(entries: list, address: str, explorer: ExplorerClient) -> list[dict]:
+    """Turn UTXO entries into transaction info dicts using the explorer."""
+    txs = await explorer.fetch_many([entry["outpoint"]["transactionId"] for entry in entries])
+    return [transaction_info(entry, txs[entry["outpoint"]["transactionId"]], address) for entry in entries]
+
+
+async def iter_enriched(entries: list, address: str, explorer: ExplorerClient,
+                        chunk_size: int = STREAM_CHUNK):
+    """Like enrich(), but yields each transaction info dict as its chunk
+    of chunk_size entries is looked up.
+
+    The lookup of the next chunk runs while the current one is consumed.
+    Entries keep the node's order (the same records, in the same order, as
+    enrich()); a transaction's lookup is dropped from the explorer's
+    in-memory cache once its last UTXO is out, so memory stays flat however
+    long the history is.
+    """
+    def tx_ids(chunk):
+        return [entry["outpoint"]["transactionId"] for entry in chunk]
+
+    last_chunk = {}  # tx id -> index of the last chunk holding one of its UTXOs
+    for position, entry in enumerate(entries):
+        last_chunk[entry["outpoint"]["transactionId"]] = position // chunk_size
+    chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+    if not chunks:
+        return
+    pending = asyncio.ensure_future(explorer.fetch_many(tx_ids(chunks[0])))
+    try:
+        for i, chunk in enumerate(chunks):
+            txs = await pending
+            upcoming = tx_ids(chunks[i + 1]) if i + 1 < len(chunks) else []
+            if upcoming:
+                pending = asyncio.ensure_future(explorer.fetch_many(upcoming))
+            for entry in chunk:
+                yield transaction_info(entry, txs[entry["outpoint"]["transactionId"]], address)
+            for tx_id in txs:
+                if last_chunk[tx_id] == i:
+                    explorer.cache.pop(tx_id, None)
+    finally:
+        pending.cancel()
+
+
+async def utxo_entries(address: str, network: str = "mainnet") -> list:
+    """Current UTXO entries of an address."""
+    client = await connect_rpc(network)
+
+    try:
+        # Get UTXOs (current unspent outputs)
+        result = await client.get_utxos_by_addresses({"addresses": [address]})
+    finally:
+        await client.disconnect()
+    return result.get("entries", [])
+
+
+async def get_transactions(address: str, network: str = "mainnet", explorer_url: str = KASPA_API,
+                           cache_file: str | None = TX_CACHE_FILE, offline: bool = False) -> list[dict]:
     """Get transaction history for an address.
-    
+
     Args:
         address: Kaspa address
         network: "mainnet" or "testnet"
-        
+        explorer_url: Kaspa REST API base URL
+        cache_file: SQLite transaction cache (None to disable)
+        offline: answer from the cache only, never call the explorer
+
     Returns:
         List of transaction info dicts
     """
-    client = RpcClient(resolver=Resolver(), network_id=network)
-    await client.connect()
-    
+    entries = await utxo_entries(address, network)
+
+    tx_cache = TxCache(cache_file) if cache_file else None
     try:
-        # Get UTXOs (current unspent outputs)
-        result = await client.get_utxos_by_addresses({"addresses": [address]})
-        
-        transactions = []
-        for entry in result.get("entries", []):
-            tx_id = entry["outpoint"]["transactionId"]
-            amount_sompi = entry["utxoEntry"]["amount"]
-            amount_kas = amount_sompi / 100_000_000
-            
-            # Fetch full transaction details
-            try:
-                tx_data = fetch_transaction(tx_id)
-                sender = find_sender_address(tx_data, address)
-                block_time = tx_data.get("block_time")
-                
-                transactions.append({
-                    "tx_id": tx_id,
-                    "amount_kas": amount_kas,
-                    "amount_sompi": amount_sompi,
-                    "sender": sender,
-                    "block_time": block_time,
-                    "is_accepted": tx_data.get("is_accepted", False),
-                })
-            except Exception as e:
-                transactions.append({
-                    "tx_id": tx_id,
-                    "amount_kas": amount_kas,
-                    "amount_sompi": amount_sompi,
-                    "sender": None,
-                    "error": str(e),
-                })
-        
-        return transactions
-        
+        async with ExplorerClient(explorer_url, tx_cache=tx_cache, offline=offline) as explorer:
+            return await enrich(entries, address, explorer)
     finally:
-        await client.disconnect()
+        if tx_cache:
+            tx_cache.close()
+
+
+async def stream_transactions(address: str, network: str = "mainnet", explorer_url: str = KASPA_API,
+                              cache_file: str | None = TX_CACHE_FILE, offline: bool = False):
+    """get_transactions() as an async generator (see iter_enriched)."""
+    entries = await utxo_entries(address, network)
+
+    tx_cache = TxCache(cache_file) if cache_file else None
+    try:
+        async with ExplorerClient(explorer_url, tx_cache=tx_cache, offline=offline) as explorer:
+            async for tx in iter_enriched(entries, address, explorer):
+                yield tx
+    finally:
+        if tx_cache:
+            tx_cache.close()
+
+
+class StubExplorer:
+    """In-process stand-in for the Kaspa REST API (background thread).
+
+    Serves GET /transactions/{id} and, with bulk=True, POST
+    /transactions/search. latency is added to every request (seconds).
+
+        with StubExplorer(latency=0.05) as explorer:
+            asyncio.run(enrich(entries, address, ExplorerClient(explorer.url)))
+    """
+
+    def __init__(self, latency: float = 0.0, bulk: bool = True):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.latency = latency
+        self.bulk = bulk
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, data):
+                with stub._lock:
+                    stub.requests += 1
+                time.sleep(stub.latency)
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/transactions/"):
+                    self._reply(200, stub.transaction(self.path.rsplit("/", 1)[1]))
+                else:
+                    self._reply(404, {"detail": "Not Found"})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.split("?")[0] == "/transactions/search" and stub.bulk:
+                    ids = json.loads(body).get("transactionIds", [])
+                    self._reply(200, [stub.transaction(tx_id) for tx_id in ids])
+                else:
+                    self._reply(404, {"detail": "Not Found"})
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 256
+
+        self._httpd = Server(("127.0.0.1", 0), Handler)
+        host, port = self._httpd.server_address[:2]
+        self.url = f"http://{host}:{port}"
+
+    @staticmethod
+    def transaction(tx_id: str) -> dict:
+        return {
+            "transaction_id": tx_id,
+            "block_time": 1700000000000,
+            "is_accepted": True,
+            "outputs": [{"script_public_key_address": f"kaspa:sender{tx_id[:8]}"}],
+        }
+
+    def __enter__(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def bench(count: int = 500, latency: float = 0.05):
+    """Enrich count UTXOs against the stub explorer: sequential per-tx
+    requests (the previous behaviour) vs ExplorerClient with and without
+    bulk search, then a repeat run answered from a warm TxCache."""
+    import tempfile
+    import httpx
+    address = "kaspa:bench"
+    entries = [{"outpoint": {"transactionId": f"{i:064x}", "index": 0}, "utxoEntry": {"amount": 100_000_000}}
+               for i in range(count)]
+
+    def sequential(url):
+        with httpx.Client(base_url=url, headers=HEADERS) as client:
+            for entry in entries:
+                client.get(f"/transactions/{entry['outpoint']['transactionId']}").json()
+
+    async def pooled(url, tx_cache=None):
+        async with ExplorerClient(url, tx_cache=tx_cache) as explorer:
+            txs = await enrich(entries, address, explorer)
+            assert len(txs) == count and not any("error" in tx for tx in txs)
+            assert all(tx["sender"] for tx in txs)
+            return explorer.requests
+
+    cache_dir = tempfile.mkdtemp(prefix="tx-cache-")
+    tx_cache = TxCache(os.path.join(cache_dir, "transactions.sqlite3"))
+
+    print(f"{count} UTXOs, {latency * 1000:.0f}ms explorer latency")
+    for label, bulk, run in (("sequential", False, lambda url: sequential(url) or count),
+                             ("concurrent", False, lambda url: asyncio.run(pooled(url))),
+                             ("bulk search", True, lambda url: asyncio.run(pooled(url, tx_cache))),
+                             ("cached", True, lambda url: asyncio.run(pooled(url, tx_cache)))):
+        with StubExplorer(latency, bulk=bulk) as stub:
+            start = time.perf_counter()
+            requests = run(stub.url)
+            elapsed = time.perf_counter() - start
+        print(f"{label:>12}: {elapsed:6.3f}s  ({requests} requests, {elapsed / latency:.1f} round trips)")
+    tx_cache.close()
 
 
 def main():
+    if sys.argv[1:2] == ["--bench"]:
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else 500)
+        return
+
     parser = argparse.ArgumentParser(
         description="Get transaction history for a Kaspa address"
     )
@@ -94,21 +492,51 @@ def main():
         default="mainnet",
         help="Network type (default: mainnet)"
     )
+    parser.add_argument(
+        "--explorer",
+        default=KASPA_API,
+        help=f"Kaspa REST API base URL (default: {KASPA_API})"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"Do not read or write the transaction cache ({TX_CACHE_FILE})"
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use only cached transactions, never call the explorer"
+    )
     parser.add_argument(
         "--json",
         action="store_true",
         help="Output as JSON"
     )
+    parser.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="Stream one compact JSON line per transaction as it is looked up"
+    )
     args = parser.parse_args()
-    
-    transactions = asyncio.run(get_transactions(args.address, args.network))
-    
+
+    if args.ndjson:
+        from ndjson import aemit_all
+
+        asyncio.run(aemit_all(stream_transactions(
+            args.address, args.network, args.explorer,
+            cache_file=None if args.no_cache else TX_CACHE_FILE, offline=args.offline)))
+        return
+
+    transactions = asyncio.run(get_transactions(
+        args.address, args.network, args.explorer,
+        cache_file=None if args.no_cache else TX_CACHE_FILE, offline=args.offline))
+
     if args.json:
         print(json.dumps(transactions, indent=2))
     else:
         print(f"📜 Transaction History for {args.address[:20]}...\n")
         print("-" * 60)
-        
+
         for tx in transactions:
             print(f"TX: {tx['tx_id'][:16]}...")
             print(f"   💰 Amount: {tx['amount_kas']} KAS")
@@ -1,77 +1,497 @@
 #!/usr/bin/env python3
 """Listen for new Kaspa transactions with message payloads on given addresses.
-Outputs JSON lines to stdout for each new message found."""
+Outputs compact JSON lines (NDJSON, flushed per line) to stdout for each new
+message found.
 
+Addresses are queried in batches (one get_utxos_by_addresses call per
+--batch-size addresses) with up to --concurrency calls in flight, so a
+cycle over 1,000 addresses is a handful of round trips. Each cycle prints
+a {"status": "cycle", ...} line with its timing.
+
+With --watch, the node pushes UTXO-changed notifications for all addresses
+over one subscription and only the deltas are processed; a full poll still
+runs every --resync seconds to catch anything a notification missed.
+
+Known UTXOs are kept per address as one sorted buffer of packed 36-byte
+outpoint keys (see OutpointSet); `--bench` measures memory and cycle
+throughput against plain "txid:index" string sets, and `--check` drives the
+watcher against a scripted fake node (no kaspa SDK or node needed)."""
+
+import argparse
 import asyncio
-import json
+import hashlib
 import sys
 import time
-from kaspa import RpcClient, Resolver
-
-
-async def check_address(client, address: str, known_utxos: set) -> list:
-    """Check for new UTXOs on an address, return new messages."""
-    result = await client.get_utxos_by_addresses({'addresses': [address]})
-    entries = result.get('entries', [])
-    
-    new_messages = []
-    current_utxos = set()
-    
-    for entry in entries:
-        outpoint = entry.get('outpoint', {})
-        utxo_id = f"{outpoint.get('transactionId', '')}:{outpoint.get('index', 0)}"
-        current_utxos.add(utxo_id)
-        
-        if utxo_id not in known_utxos:
-            tx_id = outpoint.get('transactionId', '')
-            amount = entry.get('utxoEntry', {}).get('amount', 0)
-            # We found a new UTXO, report it
-            new_messages.append({
-                'tx_id': tx_id,
-                'address': address,
-                'amount_sompi': amount,
-                'utxo_id': utxo_id,
-            })
-    
-    return new_messages, current_utxos
+
+from ndjson import emit
+
+
+RPC_URL = "ws://127.0.0.1:17210"
+POLL_INTERVAL = 10  # seconds between cycle starts
+BATCH_SIZE = 250  # addresses per get_utxos_by_addresses call
+MAX_CONCURRENCY = 4  # batch calls in flight
+RESYNC_INTERVAL = 300  # seconds between safety-net polls in --watch mode
+
+
+def utxo_id(entry: dict) -> str:
+    outpoint = entry.get('outpoint', {})
+    return f"{outpoint.get('transactionId', '')}:{outpoint.get('index', 0)}"
+
+
+_INDEX_HEX = [i.to_bytes(4, 'little').hex() for i in range(256)]
+KEY_SIZE = 36  # packed outpoint: 32-byte transaction id + uint32 index
+
+
+def outpoint_key(entry: dict) -> bytes:
+    """32-byte transaction id + little-endian uint32 output index."""
+    outpoint = entry.get('outpoint', {})
+    tx_id = outpoint.get('transactionId', '')
+    index = outpoint.get('index', 0)
+    try:
+        key = bytes.fromhex(tx_id + (_INDEX_HEX[index] if index < 256 else index.to_bytes(4, 'little').hex()))
+    except ValueError:
+        key = b''
+    if len(key) != KEY_SIZE:
+        # Not a real transaction id; hash it so every key keeps the fixed width
+        key = hashlib.blake2b(tx_id.encode(), digest_size=32).digest() + index.to_bytes(4, 'little')
+    return key
+
+
+class OutpointSet:
+    """Known UTXOs of one address, as one buffer of packed outpoint keys.
+
+    Each UTXO costs its 36-byte key and nothing else, about a quarter of a
+    set of "txid:index" strings (3.4 MB vs 15.0 MB at 100k UTXOs, see
+    --bench). The buffer keeps the order of the last listing, so sync() on
+    an unchanged listing (the common poll) is one comparison of the packed
+    keys and beats rebuilding a string set; a changed listing pays for a
+    set diff built from the buffer, somewhat slower than the string set and
+    with a transient peak. add()/discard() (notifications) find a key by
+    scanning the buffer in C, well under a millisecond per key at 100k.
+    """
+
+    __slots__ = ('buf',)
+
+    def __init__(self, entries=()):
+        self.buf = bytearray()
+        self.sync(entries)
+
+    def __len__(self):
+        return len(self.buf) // KEY_SIZE
+
+    def _find(self, key: bytes) -> int:
+        """Byte offset of key in the buffer, or -1"""
+        pos = self.buf.find(key)
+        while pos > 0 and pos % KEY_SIZE:
+            pos = self.buf.find(key, pos + 1)  # matched across two keys
+        return pos
+
+    def __contains__(self, entry: dict) -> bool:
+        return self._find(outpoint_key(entry)) >= 0
+
+    def add(self, entry: dict) -> bool:
+        """Add a UTXO; returns False if it was already known."""
+        key = outpoint_key(entry)
+        if self._find(key) >= 0:
+            return False
+        self.buf += key
+        return True
+
+    def discard(self, entry: dict):
+        pos = self._find(outpoint_key(entry))
+        if pos >= 0:
+            del self.buf[pos:pos + KEY_SIZE]
+
+    def sync(self, entries: list) -> list:
+        """Make the index match a full UTXO listing; returns the new entries."""
+        keys = [outpoint_key(e) for e in entries]
+        packed = b''.join(keys)
+        if packed == self.buf:
+            return []
+        buf = bytes(self.buf)
+        known = {buf[i:i + KEY_SIZE] for i in range(0, len(buf), KEY_SIZE)}
+        del buf
+        new = []
+        for key, entry in zip(keys, entries):
+            if key not in known:
+                known.add(key)  # a listing never holds an outpoint twice, but stay safe
+                new.append(entry)
+        self.buf = bytearray(packed)
+        return new
+
+
+async def fetch_utxos(client, addresses: list, batch_size: int = BATCH_SIZE,
+                      concurrency: int = MAX_CONCURRENCY) -> tuple[dict, dict]:
+    """Fetch the UTXO set of every address in batched, concurrent calls.
+
+    Returns (utxos, errors): utxos maps each address of a successful batch
+    to its list of entries; errors maps the addresses of failed batches to
+    the error message.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    utxos, errors = {}, {}
+
+    async def fetch_batch(batch):
+        async with semaphore:
+            try:
+                result = await client.get_utxos_by_addresses({'addresses': batch})
+            except Exception as e:
+                errors.update(dict.fromkeys(batch, str(e)))
+                return
+        found = {addr: [] for addr in batch}
+        for entry in result.get('entries', []):
+            # The SDK may hand back Address objects; compare as strings, like UtxoWatcher.apply
+            addr = str(entry.get('address') or '')
+            if addr in found:
+                found[addr].append(entry)
+        utxos.update(found)
+
+    await asyncio.gather(*(fetch_batch(addresses[i:i + batch_size])
+                           for i in range(0, len(addresses), batch_size)))
+    return utxos, errors
+
+
+def kaspa_address(address: str):
+    """The SDK Address for a string (imports kaspa on first use)."""
+    from kaspa import Address
+    return Address(address)
+
+
+def utxo_message(address: str, entry: dict) -> dict:
+    return {
+        'tx_id': entry.get('outpoint', {}).get('transactionId', ''),
+        'address': address,
+        'amount_sompi': entry.get('utxoEntry', {}).get('amount', 0),
+        'utxo_id': utxo_id(entry),
+    }
+
+
+async def poll_cycle(client, addresses: list, known: dict,
+                     batch_size: int = BATCH_SIZE, concurrency: int = MAX_CONCURRENCY) -> dict:
+    """Run one polling cycle: print new messages, update known, return timing stats."""
+    start = time.perf_counter()
+    utxos, errors = await fetch_utxos(client, addresses, batch_size, concurrency)
+    fetched = time.perf_counter()
+
+    count = 0
+    for addr, entries in utxos.items():
+        # We found a new UTXO, report it
+        for entry in known[addr].sync(entries):
+            emit(utxo_message(addr, entry))
+            count += 1
+    for addr, error in errors.items():
+        # known[addr] is kept, so anything missed is reported next cycle
+        emit({"error": error, "address": addr})
+
+    return {
+        "status": "cycle",
+        "addresses": len(addresses),
+        "batches": -(-len(addresses) // batch_size),
+        "utxos": sum(len(v) for v in utxos.values()),
+        "new": count,
+        "errors": len(errors),
+        "fetch_ms": round((fetched - start) * 1000, 1),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+class UtxoWatcher:
+    """Emits new UTXOs from the node's utxos-changed notifications.
+
+    Notifications are queued from the client callback and applied to
+    known as deltas. Every resync_interval seconds (and after a reconnect)
+    a full poll_cycle runs; queued notifications wait until it finishes,
+    so a UTXO is never reported twice. Works with any client exposing
+    add_event_listener, subscribe_utxos_changed and get_utxos_by_addresses;
+    address_factory turns the address strings into what the client's
+    subscribe_utxos_changed expects (SDK Address objects by default).
+    """
+
+    def __init__(self, client, addresses: list, known: dict, resync_interval: float = RESYNC_INTERVAL,
+                 batch_size: int = BATCH_SIZE, concurrency: int = MAX_CONCURRENCY,
+                 address_factory=kaspa_address):
+        self.client = client
+        self.addresses = addresses
+        self.known = known
+        self.resync_interval = resync_interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.address_factory = address_factory
+        self.events = asyncio.Queue()
+        self.stats = {"notifications": 0, "new": 0, "removed": 0}
+
+    def _on_event(self, event):
+        # The client may call back from its own thread
+        self.loop.call_soon_threadsafe(self.events.put_nowait, event)
+
+    async def subscribe(self):
+        await self.client.subscribe_utxos_changed([self.address_factory(a) for a in self.addresses])
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.client.add_event_listener("utxos-changed", self._on_event)
+        # The subscription does not survive a reconnect: resubscribe and resync
+        self.client.add_event_listener("connect", lambda _event: self._on_event({"type": "connect"}))
+        await self.subscribe()
+
+    def apply(self, event: dict) -> int:
+        """Apply one utxos-changed notification; returns the number of new UTXOs printed."""
+        data = event.get("data", event)
+        self.stats["notifications"] += 1
+        for entry in data.get("removed", []):
+            addr = str(entry.get("address", ""))
+            if addr in self.known:
+                self.known[addr].discard(entry)
+                self.stats["removed"] += 1
+        count = 0
+        for entry in data.get("added", []):
+            addr = str(entry.get("address", ""))
+            if addr in self.known and self.known[addr].add(entry):
+                emit(utxo_message(addr, entry))
+                count += 1
+        self.stats["new"] += count
+        return count
+
+    async def resync(self) -> dict:
+        stats = await poll_cycle(self.client, self.addresses, self.known, self.batch_size, self.concurrency)
+        stats["mode"] = "resync"
+        # Anything the resync found was missed by notifications
+        stats["missed"] = stats.pop("new")
+        stats.update(self.stats)
+        emit(stats)
+        return stats
+
+    async def run(self, cycles: int | None = None):
+        """Process notifications forever (or for a number of resync cycles)."""
+        await self.start()
+        next_resync = time.monotonic() + self.resync_interval
+        while cycles is None or cycles > 0:
+            try:
+                event = await asyncio.wait_for(self.events.get(), max(next_resync - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                event = None
+            if event is not None and event.get("type") != "connect":
+                self.apply(event)
+                continue
+            if event is not None:
+                await self.subscribe()
+            await self.resync()
+            next_resync = time.monotonic() + self.resync_interval
+            if cycles is not None:
+                cycles -= 1
+
+
+async def load_known(client, addresses: list, batch_size: int = BATCH_SIZE,
+                     concurrency: int = MAX_CONCURRENCY) -> dict:
+    """Initial OutpointSet per address (errors are printed; those start empty)."""
+    known = {addr: OutpointSet() for addr in addresses}
+    utxos, errors = await fetch_utxos(client, addresses, batch_size, concurrency)
+    for addr, entries in utxos.items():
+        known[addr].sync(entries)
+    for addr, error in errors.items():
+        emit({"error": error, "address": addr})
+    return known
 
 
 async def main():
-    if len(sys.argv) < 2:
-        print("Usage: listen_messages.py <address1> [address2] ...", file=sys.stderr)
-        sys.exit(1)
-    
-    addresses = sys.argv[1:]
-    
+    parser = argparse.ArgumentParser(description="Listen for new UTXOs on Kaspa addresses")
+    parser.add_argument("addresses", nargs="+", help="Kaspa addresses to watch")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                        help=f"Seconds between polls (default: {POLL_INTERVAL})")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"Addresses per RPC call (default: {BATCH_SIZE})")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY,
+                        help=f"RPC calls in flight (default: {MAX_CONCURRENCY})")
+    parser.add_argument("--watch", action="store_true",
+                        help="Use utxos-changed notifications; polling only as a resync")
+    parser.add_argument("--resync", type=float, default=RESYNC_INTERVAL,
+                        help=f"Seconds between resync polls with --watch (default: {RESYNC_INTERVAL})")
+    args = parser.parse_args()
+
+    addresses = list(dict.fromkeys(args.addresses))
+
+    from kaspa import RpcClient
+
     # Connect to local testnet node
-    client = RpcClient(url='ws://127.0.0.1:17210')
+    client = RpcClient(url=RPC_URL)
     await client.connect()
-    
+
     # Initialize known UTXOs
-    known = {}
-    for addr in addresses:
-        result = await client.get_utxos_by_addresses({'addresses': [addr]})
-        entries = result.get('entries', [])
-        known[addr] = set()
-        for entry in entries:
-            outpoint = entry.get('outpoint', {})
-            utxo_id = f"{outpoint.get('transactionId', '')}:{outpoint.get('index', 0)}"
-            known[addr].add(utxo_id)
-    
-    print(json.dumps({"status": "ready", "addresses": len(addresses), "known_utxos": sum(len(v) for v in known.values())}), flush=True)
-    
-    # Poll loop
+    known = await load_known(client, addresses, args.batch_size, args.concurrency)
+
+    emit({"status": "ready", "addresses": len(addresses), "known_utxos": sum(len(v) for v in known.values())})
+
+    if args.watch:
+        watcher = UtxoWatcher(client, addresses, known, args.resync, args.batch_size, args.concurrency)
+        await watcher.run()
+        return
+
+    # Poll loop: cycles start every interval; a slow cycle delays the next one
+    next_cycle = time.monotonic() + args.interval
     while True:
-        await asyncio.sleep(10)
-        for addr in addresses:
-            try:
-                new_msgs, current = await check_address(client, addr, known[addr])
-                known[addr] = current
-                for msg in new_msgs:
-                    print(json.dumps(msg), flush=True)
-            except Exception as e:
-                print(json.dumps({"error": str(e), "address": addr}), flush=True)
+        await asyncio.sleep(max(next_cycle - time.monotonic(), 0))
+        stats = await poll_cycle(client, addresses, known, args.batch_size, args.concurrency)
+        stats["overrun"] = stats["elapsed_ms"] > args.interval * 1000
+        emit(stats)
+        next_cycle = max(next_cycle + args.interval, time.monotonic())
+
+
+def bench(sizes=(10_000, 100_000, 1_000_000), churn=0.01):
+    """Memory and per-cycle cost of the known-UTXO index for one address.
+
+    Compares the previous representation (a fresh set of "txid:index"
+    strings each cycle) with OutpointSet.sync(), on a listing where churn
+    of the UTXOs were spent and as many new ones arrived.
+    """
+    import os
+    import tracemalloc
+
+    def entry(i):
+        return {'outpoint': {'transactionId': os.urandom(32).hex(), 'index': i % 4},
+                'utxoEntry': {'amount': 100_000_000}}
+
+    def legacy_cycle(known, entries):
+        current = set()
+        new = []
+        for e in entries:
+            uid = utxo_id(e)
+            current.add(uid)
+            if uid not in known:
+                new.append(e)
+        return current, new
+
+    def measure(fn, setup=lambda: None):
+        # Timed untraced; tracemalloc slows allocation down several times
+        setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        setup()
+        tracemalloc.start()
+        result = fn()
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, elapsed, size, peak
+
+    print(f"{'UTXOs':>9} {'index':>12} {'memory':>10} {'cycle':>10} {'peak alloc':>11} {'idle cycle':>11}")
+    for n in sizes:
+        entries = [entry(i) for i in range(n)]
+        changed = entries[int(n * churn):] + [entry(i) for i in range(int(n * churn))]
+        rows = []
+
+        legacy, _, legacy_mem, _ = measure(lambda: {utxo_id(e) for e in entries})
+        (_, new), t, _, peak = measure(lambda: legacy_cycle(legacy, changed))
+        _, idle, _, _ = measure(lambda: legacy_cycle(legacy, entries))
+        rows.append(("str set", legacy_mem, t, peak, idle, len(new)))
+        del legacy
+
+        index, _, index_mem, _ = measure(lambda: OutpointSet(entries))
+        _, idle, _, _ = measure(lambda: index.sync(entries))
+
+        def restore():
+            # sync() mutates, so each run starts from the same snapshot
+            index.buf = bytearray(snapshot)
+
+        snapshot = bytes(index.buf)
+        new, t, _, peak = measure(lambda: index.sync(changed), restore)
+        del snapshot
+        rows.append(("OutpointSet", index_mem, t, peak, idle, len(new)))
+        del index
+
+        for label, mem, t, peak, idle, found in rows:
+            assert found == int(n * churn)
+            print(f"{n:>9,} {label:>12} {mem / 2**20:>8.1f}MB {t * 1000:>8.0f}ms "
+                  f"{peak / 2**20:>9.1f}MB {idle * 1000:>9.0f}ms")
+
+
+class FakeNode:
+    """Scripted stand-in for RpcClient: holds UTXO sets per address and
+    pushes utxos-changed notifications on demand (for check())."""
+
+    def __init__(self):
+        self.utxos = {}  # address -> {utxo_id: entry}
+        self.listeners = {}
+        self.subscriptions = []
+        self.polls = 0
+
+    def add_event_listener(self, event, callback):
+        self.listeners.setdefault(event, []).append(callback)
+
+    async def subscribe_utxos_changed(self, addresses):
+        self.subscriptions.append(list(addresses))
+
+    async def get_utxos_by_addresses(self, request):
+        self.polls += 1
+        return {'entries': [e for a in request['addresses'] for e in self.utxos.get(a, {}).values()]}
+
+    def change(self, added=(), removed=(), notify=True):
+        """Apply a UTXO change; notify=False makes the node "lose" the notification."""
+        for entry in removed:
+            self.utxos.get(entry['address'], {}).pop(utxo_id(entry), None)
+        for entry in added:
+            self.utxos.setdefault(entry['address'], {})[utxo_id(entry)] = entry
+        if notify:
+            event = {'type': 'utxos-changed', 'data': {'added': list(added), 'removed': list(removed)}}
+            for callback in self.listeners.get('utxos-changed', []):
+                callback(event)
+
+
+def check() -> bool:
+    """Drive UtxoWatcher with a FakeNode: notifications are diffed into
+    output lines, and a notification the node never sent is picked up by
+    the resync poll."""
+    import contextlib
+    import io
+    import json
+
+    def utxo(address, n, amount=100_000_000):
+        return {'address': address, 'outpoint': {'transactionId': f'{n:064x}', 'index': 0},
+                'utxoEntry': {'amount': amount}}
+
+    a, b = 'kaspa:qfakealice', 'kaspa:qfakebob'
+    node = FakeNode()
+    node.change(added=[utxo(a, 1)], notify=False)
+
+    async def scenario():
+        known = await load_known(node, [a, b])
+        watcher = UtxoWatcher(node, [a, b], known, resync_interval=0.2, address_factory=str)
+        task = asyncio.create_task(watcher.run(cycles=1))
+        await asyncio.sleep(0.01)
+        node.change(added=[utxo(a, 2)])  # new -> one line
+        node.change(added=[utxo(a, 2)])  # duplicate notification -> nothing
+        node.change(removed=[utxo(a, 1)])  # spent -> nothing printed
+        node.change(added=[utxo(b, 3)], notify=False)  # missed -> found by the resync
+        await task
+        return known
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        known = asyncio.run(scenario())
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    utxo_lines = [(line['address'], line['tx_id'][-1]) for line in lines if 'tx_id' in line]
+    resync = [line for line in lines if line.get('mode') == 'resync']
+
+    results = [
+        ("subscribed with plain strings", node.subscriptions == [[a, b]]),
+        ("notification -> one line per new UTXO", utxo_lines[:1] == [(a, '2')]),
+        ("missed UTXO reported by the resync poll", utxo_lines[1:] == [(b, '3')]),
+        ("resync counts it as missed", len(resync) == 1 and resync[0]['missed'] == 1),
+        ("spent UTXO dropped from known", {utxo_id(e) for e in node.utxos[a].values()} == {f'{2:064x}:0'}
+         and len(known[a]) == 1 and len(known[b]) == 1),
+    ]
+    for label, ok in results:
+        print(f"{label:<42} {'OK' if ok else 'FAIL'}")
+    return all(ok for _, ok in results)
+
+
+def cli():
+    if sys.argv[1:2] == ["--bench"]:
+        bench(tuple(int(n) for n in sys.argv[2:]) or (10_000, 100_000, 1_000_000))
+    elif sys.argv[1:2] == ["--check"]:
+        sys.exit(0 if check() else 1)
+    else:
+        asyncio.run(main())
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    cli()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Newline-delimited JSON output for the scripts' --ndjson mode.
+
+Every record is one compact line (no spaces after separators), written and
+flushed as soon as it is ready, so a reader at the other end of a pipe can
+start on the first record while the script is still producing the rest,
+and the writer never holds more than the record in hand.
+
+    python3 get_transactions.py kaspa:qr... --ndjson | jq -c 'select(.amount_kas > 1)'
+
+A reader closing the pipe early (`| head`) ends the script quietly.
+"""
+
+import json
+import os
+import sys
+
+
+SEPARATORS = (",", ":")
+
+
+def dumps(record) -> str:
+    """One record as a compact JSON line (without the newline)."""
+    return json.dumps(record, separators=SEPARATORS, default=str)
+
+
+def emit(record, stream=None, flush: bool = True):
+    """Write one record (and flush it, unless flush=False)."""
+    stream = stream or sys.stdout
+    try:
+        stream.write(dumps(record) + "\n")
+        if flush:
+            stream.flush()
+    except BrokenPipeError:
+        _reader_gone(stream)
+
+
+def emit_all(records, stream=None, flush: bool = True) -> int:
+    """Emit every record of an iterable; returns the count.
+
+    flush=False leaves the stream's buffering alone (for bulk output where
+    throughput matters more than latency) and flushes once at the end.
+    """
+    stream = stream or sys.stdout
+    count = 0
+    for record in records:
+        emit(record, stream, flush)
+        count += 1
+    if not flush:
+        try:
+            stream.flush()
+        except BrokenPipeError:
+            _reader_gone(stream)
+    return count
+
+
+def _reader_gone(stream):
+    # Stop without a traceback (or another one when Python flushes at exit)
+    os.dup2(os.open(os.devnull, os.O_WRONLY), stream.fileno())
+    sys.exit(0)
+
+
+async def aemit_all(records, stream=None) -> int:
+    """Emit every record of an async iterable as it arrives; returns the count."""
+    count = 0
+    async for record in records:
+        emit(record, stream)
+        count += 1
+    return count
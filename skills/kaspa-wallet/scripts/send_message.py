@@ -9,16 +9,38 @@ Kaspa Message TX - 透過 Kaspa 交易 payload 發送/接收訊息
   # 發送訊息到指定地址
   python send_message.py send --to kaspatest:qq... --text "Hello!"
   
+  # 預先把大額 UTXO 切成 20 個 5 KAS 的 UTXO，之後的批次發送可以並行
+  python send_message.py split [--count 20] [--amount 5]
+
+  # 批次發送（每行一則，- 代表 stdin），每則訊息各花池中不同的 UTXO
+  python send_message.py batch --file messages.txt [--to kaspatest:qq...] [--concurrency 16]
+
   # 讀取地址的最近訊息
   python send_message.py read
   
   # 讀取指定 TX 的 payload
   python send_message.py read --txid abc123...
 
+  # 建立/更新本地訊息索引（從上次 checkpoint 續跑，--follow 持續追蹤新區塊）
+  python send_message.py index [--follow]
+
+  # 從本地索引讀取地址的完整訊息歷史
+  python send_message.py read --address kaspatest:qq... [--limit 50] [--since 1700000000000]
+
+  # 以 NDJSON 串流輸出（每則一行精簡 JSON、立即 flush，適合接 jq 或其他程式；--limit 0 為全部）
+  python send_message.py read --address kaspatest:qq... --ndjson --limit 0
+  python send_message.py batch --file messages.txt --ndjson
+
 原理：
   Kaspa 交易有原生 payload 欄位（不是 OP_RETURN），
   可以直接嵌入任意 bytes。Kasia 協議就是用這個機制。
   我們用 create_transaction() 的 payload 參數來嵌入 JSON 訊息。
+
+  每筆訊息交易由 UtxoPool 挑選輸入（足夠且符合 storage mass 的最小 UTXO），
+  在途交易各自花不同的 UTXO，不用等上一筆的找零確認。
+
+  本地節點只能查 UTXO，查不到歷史 payload，所以 `index` 會從節點逐塊讀取
+  交易、用 parse_message_payload() 解出訊息，依 (地址, 時間) 存進 SQLite。
 """
 
 import asyncio
@@ -27,16 +49,14 @@ import json
 import time
 import sys
 import os
+import sqlite3
+import bisect
+import threading
 
-# 確保能 import kaspa SDK
-from kaspa import (
-    RpcClient,
-    PrivateKey,
-    Address,
-    PaymentOutput,
-    create_transaction,
-    sign_transaction,
-)
+from wallet_daemon import connect_rpc
+from spend_tracker import SpendTracker, outpoint
+from fees import FeeEstimator, MAX_TX_MASS, compute_mass, fee_for, transaction_mass
+from ndjson import emit, emit_all
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # 配置
@@ -48,7 +68,19 @@ SECRETS_PATH = os.path.expanduser("~/.secrets/testnet-wallet.json")
 SECRETS_PATH_ALT = os.path.expanduser("~/clawd/.secrets/testnet-wallet.json")
 
 MAX_PAYLOAD_SIZE = 1000  # bytes
-DEFAULT_FEE = 10000  # sompi (0.0001 KAS, 足夠覆蓋最大 payload)
+
+MAX_INPUTS = 4  # 單筆交易最多幾個輸入（每個輸入約 1,100 grams compute mass）
+MESSAGE_SEND_AMOUNT = 20_000_000  # 發給別人時附帶 0.2 KAS (避免 storage mass 限制)
+POOL_UTXO_AMOUNT = 500_000_000  # split 切出的 UTXO 面額（5 KAS）
+POOL_SIZE = 20  # split 預設切出的 UTXO 數
+SEND_CONCURRENCY = 16  # batch 同時在途的訊息數
+POOL_REFRESH_INTERVAL = 1.0  # 秒，池子暫時用完時重新查 UTXO 的間隔
+POOL_WAIT_TIMEOUT = 60.0  # 秒，等待找零回到池子的上限
+
+MESSAGE_INDEX_FILE = os.path.expanduser("~/.cache/kaspa-wallet/messages.sqlite3")
+INDEX_CHUNK = 200  # 每批並行抓取的區塊數，整批寫入後才推進 checkpoint
+INDEX_CONCURRENCY = 8  # 同時進行的 get_block 請求數
+TAIL_INTERVAL = 1.0  # 秒，--follow 追上最新區塊後的輪詢間隔
 
 
 def load_wallet():
@@ -86,14 +118,318 @@ def parse_message_payload(payload_hex: str) -> dict | None:
     return None
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# 選幣與 UTXO 池
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class UtxoPool:
+    """可花費 UTXO 池：依金額與 storage mass 挑選輸入
+
+    select() 取出的輸入在 spend()/release() 之前不會再被選到，所以多筆
+    交易可以同時在途，各自花不同的 UTXO，不必等上一筆的找零。
+    已花費的 outpoint 在節點把交易接受進 UTXO 集合之前仍會被列出，
+    refresh() 會排除它們，等節點不再列出時才忘掉。
+
+    有 tracker（SpendTracker）時，選出的輸入會先在共用的資料庫保留，
+    其他行程的發送端保留中或已花費的 outpoint 也不會被選到。tracker 會
+    等資料庫的寫入鎖，所以 async 程式應以 asyncio.to_thread 呼叫
+    refresh/select/select_split/spend/release；這些方法以 lock 互斥。
+
+    手續費依交易實際的 mass（含 payload）乘上 feerate（sompi/gram）計算。
+    """
+
+    def __init__(self, entries=(), feerate: float = 1.0, tracker: SpendTracker | None = None,
+                 address: str | None = None):
+        self.feerate = feerate
+        self.tracker = tracker
+        self.address = address
+        self.available = []  # (amount, key, entry)，依金額排序
+        self.in_flight = {}  # key -> entry，已選出、尚未確定送出
+        self.spent = set()  # 本池送出、節點還沒接受的 outpoint
+        self.held = set()  # 其他發送端保留中或已花費的 outpoint
+        self._lock = threading.Lock()
+        if entries:
+            # 空列表不能拿來 reconcile：會把其他發送端已花費的 outpoint 當成已接受
+            self.refresh(entries)
+
+    key = staticmethod(outpoint)
+
+    def refresh(self, entries):
+        """以節點最新的 UTXO 列表重建可用池"""
+        listed = {self.key(e): e for e in entries}
+        with self._lock:
+            self.spent &= listed.keys()
+            if self.tracker is not None:
+                self.held = self.tracker.reconcile(self.address, listed) - self.in_flight.keys() - self.spent
+            self.available = sorted(
+                ((e["utxoEntry"]["amount"], k, e) for k, e in listed.items()
+                 if k not in self.spent and k not in self.in_flight and k not in self.held),
+                key=lambda item: item[:2],
+            )
+
+    @property
+    def pending(self) -> bool:
+        """是否還有在途交易（它們的找零之後會回到池子，或被其他發送端釋放）"""
+        return bool(self.in_flight or self.spent or self.held)
+
+    def _outputs(self, total: int, send_amount: int, fee: int) -> list[int] | None:
+        """輸出金額：自發自收只有一個 output；發給別人是 [send_amount, 找零]"""
+        if not send_amount:
+            return [total - fee] if total > fee else None
+        change = total - send_amount - fee
+        if change < 0:
+            return None
+        return [send_amount, change] if change else [send_amount]
+
+    def _priced_outputs(self, amounts: list[int], send_amount: int, payload_len: int) -> list[int] | None:
+        """扣掉依 mass 計價的手續費後的輸出金額；付不起或超過 mass 上限時回傳 None"""
+        total = sum(amounts)
+        fee = fee_for(compute_mass(len(amounts), 2 if send_amount else 1, payload_len), self.feerate)
+        for _ in range(3):  # 手續費扣多了找零變小、storage mass 變大，重算到付得起為止
+            outputs = self._outputs(total, send_amount, fee)
+            if outputs is None:
+                return None
+            mass = transaction_mass(amounts, outputs, payload_len)
+            if mass > MAX_TX_MASS:
+                return None
+            required = fee_for(mass, self.feerate)
+            if required <= fee:
+                return outputs
+            fee = required
+        return None
+
+    def select(self, send_amount: int = 0, payload_len: int = 0) -> tuple[list, list[int]] | None:
+        """挑選輸入，回傳 (inputs, output 金額)；目前沒有合適的組合時回傳 None
+
+        先找金額足夠、mass 合法的最小單一 UTXO（大額留給後續訊息，也順便
+        消化零錢），找不到再由大到小累加最多 MAX_INPUTS 個。
+        """
+        with self._lock:
+            while True:
+                plan = self._plan(send_amount, payload_len)
+                if plan is None:
+                    return None
+                inputs = self._take(plan[0])
+                if inputs is not None:
+                    return inputs, plan[1]
+
+    def _plan(self, send_amount: int, payload_len: int) -> tuple[list[int], list[int]] | None:
+        need = send_amount + fee_for(compute_mass(1, 1, payload_len), self.feerate)
+        start = bisect.bisect_left(self.available, need, key=lambda item: item[0])
+        for i in range(start, len(self.available)):
+            outputs = self._priced_outputs([self.available[i][0]], send_amount, payload_len)
+            if outputs:
+                return [i], outputs
+
+        picked, amounts = [], []
+        for i in range(len(self.available) - 1, -1, -1):
+            if len(picked) == MAX_INPUTS:
+                break
+            picked.append(i)
+            amounts.append(self.available[i][0])
+            if len(picked) > 1:
+                outputs = self._priced_outputs(amounts, send_amount, payload_len)
+                if outputs:
+                    return picked, outputs
+        return None
+
+    def select_split(self, count: int, amount: int) -> tuple[list, list[int]]:
+        """挑選切池交易的輸入：count 個 amount 面額的 output，加上找零"""
+        with self._lock:
+            while True:
+                picked, outputs = self._plan_split(count, amount)
+                inputs = self._take(picked)
+                if inputs is not None:
+                    return inputs, outputs
+
+    def _plan_split(self, count: int, amount: int) -> tuple[list[int], list[int]]:
+        picked, amounts, fee = [], [], 0
+        for i in range(len(self.available) - 1, -1, -1):
+            if len(picked) == MAX_INPUTS:
+                break
+            picked.append(i)
+            amounts.append(self.available[i][0])
+            fee = fee_for(compute_mass(len(picked), count + 1), self.feerate)
+            if sum(amounts) >= count * amount + fee:
+                break
+        change = sum(amounts) - count * amount - fee
+        if change >= 0:
+            outputs = [amount] * count + ([change] if change else [])
+            mass = transaction_mass(amounts, outputs)
+            if mass > MAX_TX_MASS:
+                raise ValueError(f"mass {mass} 超過上限 {MAX_TX_MASS}，請減少 --count 或加大 --amount")
+            change = sum(amounts) - count * amount - fee_for(mass, self.feerate)
+        if change < 0:
+            raise ValueError(f"餘額不足以切出 {count} 個 {amount / 1e8:g} KAS 的 UTXO")
+        return picked, [amount] * count + ([change] if change else [])
+
+    def _take(self, indexes: list[int]) -> list | None:
+        """把選中的 UTXO 移到 in_flight；被其他發送端搶先保留時回傳 None"""
+        if self.tracker is not None:
+            held = self.tracker.reserve([self.available[i][1] for i in indexes], self.address)
+            if held:
+                self.held |= held
+                self.available = [item for item in self.available if item[1] not in held]
+                return None
+        inputs = []
+        for i in sorted(indexes, reverse=True):
+            _, k, entry = self.available.pop(i)
+            self.in_flight[k] = entry
+            inputs.append(entry)
+        return inputs
+
+    def spend(self, inputs: list, tx_id: str):
+        """交易已送出：輸入不再回到池子"""
+        keys = [self.key(entry) for entry in inputs]
+        with self._lock:
+            for k in keys:
+                self.in_flight.pop(k, None)
+                self.spent.add(k)
+            if self.tracker is not None:
+                self.tracker.mark_spent(keys, tx_id)
+
+    def release(self, inputs: list):
+        """交易沒送出：輸入放回池子"""
+        released = []
+        with self._lock:
+            for entry in inputs:
+                k = self.key(entry)
+                if self.in_flight.pop(k, None) is not None:
+                    bisect.insort(self.available, (entry["utxoEntry"]["amount"], k, entry),
+                                  key=lambda item: item[:2])
+                    released.append(k)
+            if self.tracker is not None:
+                self.tracker.release(released)
+
+
+def kaspa_signer(private_key_hex: str):
+    """回傳 sign(inputs, outputs, payload)，以 kaspa SDK 建構並簽署交易"""
+    from kaspa import PrivateKey, Address, PaymentOutput, create_transaction, sign_transaction
+
+    pk = PrivateKey(private_key_hex)
+
+    def sign(inputs: list, outputs: list[tuple[str, int]], payload: bytes):
+        tx = create_transaction(
+            utxo_entry_source=inputs,
+            outputs=[PaymentOutput(Address(address), amount) for address, amount in outputs],
+            priority_fee=0,  # 手續費 = 輸入總額 - 輸出總額
+            payload=payload,
+        )
+        return sign_transaction(tx, [pk], False)
+
+    return sign
+
+
+class MessageSender:
+    """從 UtxoPool 取輸入發送訊息；send_many() 讓多則訊息同時在途
+
+    池子暫時選不出輸入、但還有在途交易時，每 refresh_interval 秒重新查
+    一次 UTXO，等找零被節點接受後再用，最多等 POOL_WAIT_TIMEOUT 秒。
+
+    feerate 取自節點的 fee estimate（FeeEstimator 快取）：confirm_within
+    為希望幾秒內確認，None 時用一般檔位。
+    """
+
+    def __init__(self, rpc, address: str, sign, refresh_interval: float = POOL_REFRESH_INTERVAL,
+                 tracker: SpendTracker | None = None, fees: FeeEstimator | None = None,
+                 confirm_within: float | None = None):
+        self.rpc = rpc
+        self.address = address
+        self.sign = sign
+        self.refresh_interval = refresh_interval
+        self.fees = fees or FeeEstimator(rpc, "testnet-10")
+        self.confirm_within = confirm_within
+        # 預設與其他行程共用 pending-spend 資料庫
+        self.pool = UtxoPool(tracker=tracker or SpendTracker(), address=address)
+        self._refresh_lock = asyncio.Lock()
+        self._refreshed_at = 0.0
+
+    async def refresh(self, force: bool = True):
+        async with self._refresh_lock:
+            if not force and time.monotonic() - self._refreshed_at < self.refresh_interval:
+                return  # 其他等待者剛查過
+            result = await self.rpc.get_utxos_by_addresses(request={"addresses": [self.address]})
+            # tracker 的 SQLite 呼叫可能要等其他發送端的寫入鎖，不佔住 event loop
+            await asyncio.to_thread(self.pool.refresh, result.get("entries", []))
+            self._refreshed_at = time.monotonic()
+
+    async def _acquire(self, select):
+        deadline = time.monotonic() + POOL_WAIT_TIMEOUT
+        while True:
+            picked = await asyncio.to_thread(select)
+            if picked is not None:
+                return picked
+            if not self.pool.pending:
+                raise ValueError("餘額不足")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{POOL_WAIT_TIMEOUT:g} 秒內沒有可用的 UTXO")
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh(force=False)
+
+    async def _submit(self, inputs: list, outputs: list[tuple[str, int]], payload: bytes = b"") -> str:
+        try:
+            tx = self.sign(inputs, outputs, payload)
+            result = await self.rpc.submit_transaction(request={"transaction": tx, "allow_orphan": False})
+        except BaseException:
+            await asyncio.to_thread(self.pool.release, inputs)
+            raise
+        tx_id = result.get("transactionId", str(result))
+        await asyncio.to_thread(self.pool.spend, inputs, tx_id)
+        return tx_id
+
+    async def send(self, text: str, to_address: str = None, sender: str = "nami") -> str:
+        payload = build_message_payload(text, sender)
+        dest = to_address or self.address
+        # 發給別人時附帶小額（避免 storage mass 限制），找零回自己
+        send_amount = 0 if dest == self.address else MESSAGE_SEND_AMOUNT
+        self.pool.feerate = await self.fees.feerate(self.confirm_within)
+        inputs, amounts = await self._acquire(lambda: self.pool.select(send_amount, len(payload)))
+        addresses = [dest, self.address][:len(amounts)]
+        return await self._submit(inputs, list(zip(addresses, amounts)), payload)
+
+    async def send_many(self, texts: list[str], to_address: str = None, sender: str = "nami",
+                        concurrency: int = SEND_CONCURRENCY, on_result=None) -> list[dict]:
+        """並行發送，回傳與 texts 同順序的 {"text", "tx_id"} 或 {"text", "error"}
+
+        on_result 會在每則完成時立刻以該結果呼叫（完成順序）
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(text):
+            async with semaphore:
+                try:
+                    result = {"text": text, "tx_id": await self.send(text, to_address, sender)}
+                except Exception as e:
+                    result = {"text": text, "error": str(e)}
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        return await asyncio.gather(*(one(t) for t in texts))
+
+    async def split(self, count: int = POOL_SIZE, amount: int = POOL_UTXO_AMOUNT) -> str:
+        """把大額 UTXO 切成 count 個 amount 面額的 UTXO（找零也回到池子）"""
+        self.pool.feerate = await self.fees.feerate(self.confirm_within)
+        inputs, amounts = await self._acquire(lambda: self.pool.select_split(count, amount))
+        return await self._submit(inputs, [(self.address, a) for a in amounts])
+
+
+async def connect_node():
+    from kaspa import RpcClient
+
+    rpc = RpcClient(resolver=None, url=DEFAULT_NODE, network_id="testnet-10")
+    await rpc.connect()
+    return rpc
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # 發送訊息
 # ═══════════════════════════════════════════════════════════════════════════════
 
-async def send_message(text: str, to_address: str = None, sender: str = "nami"):
+async def send_message(text: str, to_address: str = None, sender: str = "nami",
+                       confirm_within: float | None = None):
     """發送帶訊息 payload 的交易"""
     private_key_hex, my_address = load_wallet()
-    pk = PrivateKey(private_key_hex)
     dest_address = to_address or my_address
 
     payload_bytes = build_message_payload(text, sender)
@@ -102,65 +438,321 @@ async def send_message(text: str, to_address: str = None, sender: str = "nami"):
     print(f"📤 從: {my_address[:20]}...")
     print(f"📥 到: {dest_address[:20]}...")
 
-    # 連接 RPC
-    rpc = RpcClient(
-        resolver=None,
-        url=DEFAULT_NODE,
-        network_id="testnet-10",
-    )
-    await rpc.connect()
+    # kaspa SDK 只在真的要發送時才載入（read/index/--help 不需要）
+    rpc = await connect_node()
     print("✅ 已連接節點")
 
     try:
-        # 取得 UTXOs
-        result = await rpc.get_utxos_by_addresses(request={"addresses": [my_address]})
-        entries = result.get("entries", [])
-        if not entries:
+        messenger = MessageSender(rpc, my_address, kaspa_signer(private_key_hex), confirm_within=confirm_within)
+        await messenger.refresh()
+        if not messenger.pool.available:
             print("❌ 沒有 UTXO")
             return None
+        try:
+            tx_id = await messenger.send(text, to_address, sender)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return None
+        print(f"✅ TX 已發送: {tx_id}（feerate {messenger.pool.feerate:g} sompi/gram）")
+        return tx_id
 
-        # 選最大的 UTXO（避免 storage mass 問題）
-        entries.sort(key=lambda e: e["utxoEntry"]["amount"], reverse=True)
-        entry = entries[0]
-        amount = entry["utxoEntry"]["amount"]
-        print(f"💰 使用 UTXO: {amount / 1e8:.4f} KAS ({amount} sompi)")
+    finally:
+        await rpc.disconnect()
 
-        # 建構交易：自己 → 目標地址（扣手續費）
-        dest_addr = Address(dest_address)
-        change_addr = Address(my_address)
-        
-        if dest_address == my_address:
-            # 自發自收：單一 output
-            outputs = [PaymentOutput(dest_addr, amount - DEFAULT_FEE)]
+
+async def send_batch(texts: list[str], to_address: str = None, sender: str = "nami",
+                     concurrency: int = SEND_CONCURRENCY, confirm_within: float | None = None,
+                     ndjson: bool = False) -> list[dict]:
+    """並行發送多則訊息，每則各花池中不同的 UTXO
+
+    每則完成就輸出一行；ndjson=True 時輸出 JSON 行，最後一行是 {"status": "batch", ...} 統計
+    """
+    private_key_hex, my_address = load_wallet()
+    rpc = await connect_node()
+    try:
+        messenger = MessageSender(rpc, my_address, kaspa_signer(private_key_hex), confirm_within=confirm_within)
+        await messenger.refresh()
+        started = time.perf_counter()
+        results = await messenger.send_many(texts, to_address, sender, concurrency,
+                                            on_result=emit if ndjson else print_send_result)
+        elapsed = time.perf_counter() - started
+        sent = sum('tx_id' in r for r in results)
+        if ndjson:
+            emit({"status": "batch", "sent": sent, "total": len(texts), "elapsed_ms": round(elapsed * 1000, 1)})
         else:
-            # 發給別人：小額給對方，剩餘找零回自己
-            send_amount = 20_000_000  # 0.2 KAS (避免 storage mass 限制)
-            change_amount = amount - send_amount - DEFAULT_FEE
-            if change_amount < 0:
-                print(f"❌ 餘額不足")
-                return None
-            outputs = [PaymentOutput(dest_addr, send_amount)]
-            if change_amount > 0:
-                outputs.append(PaymentOutput(change_addr, change_amount))
+            print(f"📊 {sent}/{len(texts)} 則已發送，{elapsed:.2f}s（{sent / max(elapsed, 1e-9):.1f} 則/秒）")
+        return results
+    finally:
+        await rpc.disconnect()
 
-        tx = create_transaction(
-            utxo_entry_source=[entry],
-            outputs=outputs,
-            priority_fee=0,
-            payload=payload_bytes,
-        )
 
-        signed_tx = sign_transaction(tx, [pk], False)
+def print_send_result(r: dict):
+    print(f"{'✅' if 'tx_id' in r else '❌'} {r['text'][:40]}: {r.get('tx_id') or r['error']}", flush=True)
 
-        # 提交
-        result = await rpc.submit_transaction(
-            request={"transaction": signed_tx, "allow_orphan": False}
-        )
-        tx_id = result.get("transactionId", str(result))
-        print(f"✅ TX 已發送: {tx_id}")
+
+async def split_pool(count: int = POOL_SIZE, amount: int = POOL_UTXO_AMOUNT,
+                     confirm_within: float | None = None) -> str:
+    """預先切出 count 個 UTXO，讓之後的批次發送可以並行"""
+    private_key_hex, my_address = load_wallet()
+    rpc = await connect_node()
+    try:
+        messenger = MessageSender(rpc, my_address, kaspa_signer(private_key_hex), confirm_within=confirm_within)
+        await messenger.refresh()
+        tx_id = await messenger.split(count, amount)
+        print(f"✅ 切池交易已發送: {tx_id}（{count} × {amount / 1e8:g} KAS）")
         return tx_id
+    finally:
+        await rpc.disconnect()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# 吞吐量 benchmark（模擬節點）
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class StubNode:
+    """模擬節點：交易送出 accept_delay 秒後才被接受進 UTXO 集合，
+    重複花費同一個 outpoint 會被拒絕"""
+
+    FEE_ESTIMATE = {"priorityBucket": {"feerate": 3.0, "estimatedSeconds": 1.0},
+                    "normalBuckets": [{"feerate": 1.5, "estimatedSeconds": 5.0}],
+                    "lowBuckets": [{"feerate": 1.0, "estimatedSeconds": 30.0}]}
+
+    def __init__(self, address: str, amounts: list[int], submit_latency: float = 0.02,
+                 accept_delay: float = 0.2):
+        self.address = address
+        self.submit_latency = submit_latency
+        self.accept_delay = accept_delay
+        self.utxos = {}
+        self.mempool_spent = set()
+        self.pending = []  # (accept_at, tx_id, tx)
+        self.submitted = 0
+        self.rejected = 0
+        self.fees_paid = 0
+        self._accept_tx(f"{0:064x}", {"inputs": [], "outputs": [(address, a) for a in amounts]})
+
+    def _accept_tx(self, tx_id: str, tx: dict):
+        for entry in tx["inputs"]:
+            self.utxos.pop(UtxoPool.key(entry), None)
+            self.mempool_spent.discard(UtxoPool.key(entry))
+        for index, (address, amount) in enumerate(tx["outputs"]):
+            if address == self.address:
+                self.utxos[(tx_id, index)] = {
+                    "address": address,
+                    "outpoint": {"transactionId": tx_id, "index": index},
+                    "utxoEntry": {"amount": amount, "scriptPublicKey": "", "blockDaaScore": 0, "isCoinbase": False},
+                }
+
+    async def get_fee_estimate(self, request: dict) -> dict:
+        return {"estimate": self.FEE_ESTIMATE}
+
+    async def get_utxos_by_addresses(self, request: dict) -> dict:
+        now = time.monotonic()
+        while self.pending and self.pending[0][0] <= now:
+            _, tx_id, tx = self.pending.pop(0)
+            self._accept_tx(tx_id, tx)
+        return {"entries": list(self.utxos.values())}
+
+    async def submit_transaction(self, request: dict) -> dict:
+        await asyncio.sleep(self.submit_latency)
+        tx = request["transaction"]
+        keys = [UtxoPool.key(e) for e in tx["inputs"]]
+        if any(k in self.mempool_spent or k not in self.utxos for k in keys):
+            self.rejected += 1
+            raise RuntimeError("double spend")
+        self.mempool_spent.update(keys)
+        self.submitted += 1
+        self.fees_paid += sum(e["utxoEntry"]["amount"] for e in tx["inputs"]) - sum(a for _, a in tx["outputs"])
+        tx_id = f"{self.submitted:064x}"
+        self.pending.append((time.monotonic() + self.accept_delay, tx_id, tx))
+        return {"transactionId": tx_id}
+
+
+def bench(messages: int = 100, pool: int = 16, accept_delay: float = 0.2, submit_latency: float = 0.02):
+    """量測批次發送吞吐量（簽章以 stub 代替）
+
+    比較單一 UTXO 逐則等待找零、預切池並行發送，以及兩個發送端（模擬兩個
+    行程）同時花同一個錢包時，各自保留 vs 共用 pending-spend 資料庫。
+    """
+    import tempfile
+
+    address = "kaspatest:bench"
+    texts = [f"bench message {i}" for i in range(messages)]
+
+    def stub_sign(inputs, outputs, payload):
+        return {"inputs": inputs, "outputs": outputs, "payload": payload}
+
+    async def scenario(split: int, senders: int, tracker_path: str) -> tuple[float, list, StubNode]:
+        node = StubNode(address, [1000 * 100_000_000], submit_latency, accept_delay)
+        # 每個發送端各自連線 tracker，跟分開的行程一樣
+        messengers = [MessageSender(node, address, stub_sign, refresh_interval=accept_delay / 4,
+                                    tracker=SpendTracker(tracker_path), fees=FeeEstimator(node, cache_file=None))
+                      for _ in range(senders)]
+        started = time.perf_counter()
+        await messengers[0].refresh()
+        if split:
+            await messengers[0].split(split, POOL_UTXO_AMOUNT)
+        for m in messengers:
+            await m.refresh()
+        concurrency = max(split // senders, 1)
+        batches = await asyncio.gather(*(m.send_many(texts[i::senders], concurrency=concurrency)
+                                         for i, m in enumerate(messengers)))
+        return time.perf_counter() - started, [r for batch in batches for r in batch], node
+
+    print(f"{messages} 則訊息，送出延遲 {submit_latency * 1000:.0f}ms，接受延遲 {accept_delay * 1000:.0f}ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        shared = os.path.join(tmp, "pending_spends.sqlite3")
+        cases = [
+            ("單一 UTXO（逐則等待找零）", 0, 1, ":memory:"),
+            (f"預切池 {pool} 個 UTXO", pool, 1, ":memory:"),
+            ("2 個發送端，各自保留", pool, 2, ":memory:"),
+            ("2 個發送端，共用 tracker", pool, 2, shared),
+        ]
+        for label, split, senders, tracker_path in cases:
+            elapsed, results, node = asyncio.run(scenario(split, senders, tracker_path))
+            failed = sum("error" in r for r in results)
+            print(f"  {label:<24} {elapsed:6.2f}s  {messages / elapsed:7.1f} 則/秒  "
+                  f"交易 {node.submitted}，節點拒絕 {node.rejected}，失敗 {failed}，"
+                  f"平均手續費 {node.fees_paid // max(node.submitted, 1)} sompi")
+
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# 訊息索引
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class MessageIndex:
+    """本地訊息索引（SQLite）
+
+    messages 以 tx_id 為主鍵（同一交易出現在多個區塊只存一次），
+    message_addresses 以 (address, block_time) 建索引，讓 read --address
+    只需一次索引查詢。checkpoint 是最後一個已完整寫入的區塊 hash。
+    """
+
+    def __init__(self, path: str = MESSAGE_INDEX_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                tx_id TEXT PRIMARY KEY,
+                block_hash TEXT,
+                block_time INTEGER,
+                sender TEXT,
+                text TEXT,
+                payload TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS message_addresses (
+                address TEXT NOT NULL,
+                block_time INTEGER,
+                tx_id TEXT NOT NULL,
+                PRIMARY KEY (address, tx_id)
+            );
+            CREATE INDEX IF NOT EXISTS message_addresses_time
+                ON message_addresses (address, block_time);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def checkpoint(self) -> str | None:
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'checkpoint'").fetchone()
+        return row[0] if row else None
+
+    def add_blocks(self, blocks: list, checkpoint: str) -> int:
+        """寫入一批區塊裡的訊息並推進 checkpoint（同一個 transaction），回傳新訊息數"""
+        messages, addresses = [], []
+        for block in blocks:
+            header = block.get("header", {})
+            block_hash = header.get("hash") or block.get("verboseData", {}).get("hash")
+            for tx in block.get("transactions", []):
+                msg = parse_message_payload(tx.get("payload") or "")
+                if msg is None:
+                    continue
+                verbose = tx.get("verboseData", {})
+                tx_id = verbose.get("transactionId")
+                block_time = verbose.get("blockTime") or header.get("timestamp")
+                messages.append((tx_id, block_hash, block_time, msg.get("from"), msg.get("text"),
+                                 json.dumps(msg, ensure_ascii=False)))
+                for out in tx.get("outputs", []):
+                    addr = out.get("verboseData", {}).get("scriptPublicKeyAddress")
+                    if addr:
+                        addresses.append((addr, block_time, tx_id))
+        with self.db:
+            before = self.db.total_changes
+            self.db.executemany("INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?, ?)", messages)
+            added = self.db.total_changes - before
+            self.db.executemany("INSERT OR IGNORE INTO message_addresses VALUES (?, ?, ?)", addresses)
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('checkpoint', ?)", (checkpoint,))
+        return added
+
+    def for_address(self, address: str, limit: int = 50, since: int = 0) -> list[dict]:
+        """地址的訊息，新到舊；since 為 block_time（毫秒）下限"""
+        return list(self.iter_address(address, limit, since))
+
+    def iter_address(self, address: str, limit: int | None = 50, since: int = 0):
+        """for_address() 的 generator 版本：逐列從 cursor 讀出，limit=None 為不限"""
+        rows = self.db.execute("""
+            SELECT m.tx_id, m.block_time, m.payload FROM message_addresses a
+            JOIN messages m ON m.tx_id = a.tx_id
+            WHERE a.address = ? AND a.block_time >= ?
+            ORDER BY a.block_time DESC LIMIT ?
+        """, (address, since, -1 if limit is None else limit))
+        for tx_id, block_time, payload in rows:
+            yield {"tx_id": tx_id, "block_time": block_time, **json.loads(payload)}
+
+    def close(self):
+        self.db.close()
+
+
+async def fetch_blocks(rpc, hashes: list, concurrency: int = INDEX_CONCURRENCY) -> list:
+    """並行抓取完整區塊（含交易），順序與 hashes 相同"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(block_hash):
+        async with semaphore:
+            result = await rpc.get_block(request={"hash": block_hash, "includeTransactions": True})
+            return result.get("block", result)
+
+    return await asyncio.gather(*(fetch(h) for h in hashes))
+
+
+async def index_messages(rpc, index: MessageIndex, start_hash: str = None, follow: bool = False,
+                         concurrency: int = INDEX_CONCURRENCY) -> int:
+    """從 checkpoint（或 start_hash / pruning point）往後建立索引，回傳新訊息數
+
+    get_blocks 只拿 hash（便宜），完整區塊再以 INDEX_CHUNK 為一批並行抓取；
+    每批寫入後 checkpoint 推進到該批最後一塊，中斷後從那裡續跑。
+    """
+    low = index.checkpoint() or start_hash
+    if not low:
+        low = (await rpc.get_block_dag_info())["pruningPointHash"]
+    total = 0
+    while True:
+        result = await rpc.get_blocks(request={"lowHash": low, "includeBlocks": False, "includeTransactions": False})
+        hashes = [h for h in result.get("blockHashes", []) if h != low]
+        if not hashes:
+            if not follow:
+                return total
+            await asyncio.sleep(TAIL_INTERVAL)
+            continue
+        for i in range(0, len(hashes), INDEX_CHUNK):
+            chunk = hashes[i:i + INDEX_CHUNK]
+            started = time.perf_counter()
+            blocks = await fetch_blocks(rpc, chunk, concurrency)
+            added = index.add_blocks(blocks, checkpoint=chunk[-1])
+            total += added
+            low = chunk[-1]
+            print(f"📦 {len(chunk)} 個區塊，{added} 則新訊息 ({time.perf_counter() - started:.2f}s)，"
+                  f"checkpoint {low[:16]}...", flush=True)
+
+
+async def run_indexer(follow: bool = False, concurrency: int = INDEX_CONCURRENCY):
+    # wallet daemon 執行中就用它的常駐連線
+    rpc = await connect_rpc("testnet-10", DEFAULT_NODE)
+    print("✅ 已連接節點")
+    index = MessageIndex()
+    try:
+        total = await index_messages(rpc, index, follow=follow, concurrency=concurrency)
+        print(f"✅ 索引完成，新增 {total} 則訊息")
     finally:
+        index.close()
         await rpc.disconnect()
 
 
@@ -168,17 +760,60 @@ async def send_message(text: str, to_address: str = None, sender: str = "nami"):
 # 讀取訊息
 # ═══════════════════════════════════════════════════════════════════════════════
 
-async def read_messages(address: str = None, txid: str = None):
-    """讀取地址相關交易的 payload 訊息"""
+def read_indexed_messages(address: str, limit: int = 50, since: int = 0) -> list[dict] | None:
+    """從本地索引讀取訊息；尚未建立索引時回傳 None"""
+    if not os.path.exists(MESSAGE_INDEX_FILE):
+        return None
+    index = MessageIndex()
+    try:
+        if index.checkpoint() is None:
+            return None
+        return index.for_address(address, limit, since)
+    finally:
+        index.close()
+
+
+def emit_indexed_messages(address: str, limit: int | None = 50, since: int = 0) -> bool:
+    """從本地索引逐則輸出 JSON 行（每行 flush，不整批載入）；尚未建立索引時回傳 False"""
+    if not os.path.exists(MESSAGE_INDEX_FILE):
+        return False
+    index = MessageIndex()
+    try:
+        if index.checkpoint() is None:
+            return False
+        emit_all(index.iter_address(address, limit, since))
+        return True
+    finally:
+        index.close()
+
+
+async def read_messages(address: str = None, txid: str = None, limit: int = 50, since: int = 0,
+                        ndjson: bool = False):
+    """讀取地址相關交易的 payload 訊息（ndjson=True 時只讀本地索引，輸出 JSON 行）"""
     if not address and not txid:
         _, address = load_wallet()
 
-    rpc = RpcClient(
-        resolver=None,
-        url=DEFAULT_NODE,
-        network_id="testnet-10",
-    )
-    await rpc.connect()
+    if ndjson:
+        if txid:
+            emit({"tx_id": txid, "error": "本地節點不支援按 TX ID 查詢 payload",
+                  "explorer": f"https://explorer-tn10.kaspa.org/txs/{txid}"})
+        elif not emit_indexed_messages(address, limit, since):
+            emit({"address": address, "error": "尚未建立本地索引，請先執行 send_message.py index"})
+        return
+
+    if address and not txid:
+        started = time.perf_counter()
+        messages = read_indexed_messages(address, limit, since)
+        if messages is not None:
+            print(f"🔍 地址: {address[:30]}...（本地索引，{(time.perf_counter() - started) * 1000:.1f}ms）")
+            print(f"📊 找到 {len(messages)} 則訊息")
+            for msg in messages:
+                when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime((msg["block_time"] or 0) / 1000))
+                print(f"📨 [{when}] {msg.get('from', '?')}: {msg['text']}")
+                print(f"   TX: {msg['tx_id']}")
+            return
+
+    rpc = await connect_rpc("testnet-10", DEFAULT_NODE)
     print("✅ 已連接節點")
 
     try:
@@ -192,7 +827,7 @@ async def read_messages(address: str = None, txid: str = None):
         # 查詢 UTXO（只能看到未花費的，歷史需要 indexer）
         print(f"🔍 查詢地址: {address[:30]}...")
         print("ℹ️  本地節點只能查 UTXO，無法查歷史交易 payload")
-        print("   完整訊息歷史需要 Kaspa indexer/explorer")
+        print("   先執行 `send_message.py index` 建立本地索引，即可讀取完整訊息歷史")
         
         result = await rpc.get_utxos_by_addresses(request={"addresses": [address]})
         entries = result.get("entries", [])
@@ -215,21 +850,64 @@ def main():
     send_p.add_argument("--text", "-t", required=True, help="訊息內容")
     send_p.add_argument("--to", help="目標地址（預設自己）")
     send_p.add_argument("--from-name", default="nami", help="發送者名稱")
+    send_p.add_argument("--confirm-within", type=float, help="希望幾秒內確認（依節點 fee estimate 選 feerate）")
+
+    # batch
+    batch_p = sub.add_parser("batch", help="批次並行發送訊息")
+    batch_p.add_argument("--file", "-f", required=True, help="訊息檔（每行一則，- 為 stdin）")
+    batch_p.add_argument("--to", help="目標地址（預設自己）")
+    batch_p.add_argument("--from-name", default="nami", help="發送者名稱")
+    batch_p.add_argument("--concurrency", type=int, default=SEND_CONCURRENCY, help="同時在途的訊息數")
+    batch_p.add_argument("--confirm-within", type=float, help="希望幾秒內確認（依節點 fee estimate 選 feerate）")
+    batch_p.add_argument("--ndjson", action="store_true", help="每則完成即輸出一行精簡 JSON")
+
+    # split
+    split_p = sub.add_parser("split", help="預先切出 UTXO 池")
+    split_p.add_argument("--count", type=int, default=POOL_SIZE, help="切出幾個 UTXO")
+    split_p.add_argument("--amount", type=float, default=POOL_UTXO_AMOUNT / 1e8, help="每個 UTXO 的 KAS 面額")
+    split_p.add_argument("--confirm-within", type=float, help="希望幾秒內確認（依節點 fee estimate 選 feerate）")
+
+    # bench
+    bench_p = sub.add_parser("bench", help="以模擬節點量測批次發送吞吐量")
+    bench_p.add_argument("--messages", type=int, default=100, help="訊息數")
+    bench_p.add_argument("--pool", type=int, default=16, help="預切池大小")
+    bench_p.add_argument("--accept-delay", type=float, default=0.2, help="模擬節點接受交易的延遲（秒）")
 
     # read
     read_p = sub.add_parser("read", help="讀取訊息")
     read_p.add_argument("--address", "-a", help="地址")
     read_p.add_argument("--txid", help="交易 ID")
+    read_p.add_argument("--limit", type=int, default=50, help="最多幾則訊息（本地索引，0 為不限）")
+    read_p.add_argument("--since", type=int, default=0, help="只讀此時間之後的訊息（毫秒 timestamp）")
+    read_p.add_argument("--ndjson", action="store_true", help="從本地索引逐則輸出精簡 JSON 行")
+
+    # index
+    index_p = sub.add_parser("index", help="建立/更新本地訊息索引")
+    index_p.add_argument("--follow", action="store_true", help="追上後持續追蹤新區塊")
+    index_p.add_argument("--concurrency", type=int, default=INDEX_CONCURRENCY, help="並行 get_block 數")
 
     args = parser.parse_args()
 
     if args.command == "send":
-        tx_id = asyncio.run(send_message(args.text, args.to, args.from_name))
+        tx_id = asyncio.run(send_message(args.text, args.to, args.from_name, args.confirm_within))
         if tx_id:
             print(f"\n🎉 成功！查看交易:")
             print(f"   https://explorer-tn10.kaspa.org/txs/{tx_id}")
+    elif args.command == "batch":
+        with (sys.stdin if args.file == "-" else open(args.file)) as f:
+            texts = [line.rstrip("\n") for line in f if line.strip()]
+        results = asyncio.run(send_batch(texts, args.to, args.from_name, args.concurrency, args.confirm_within,
+                                         ndjson=args.ndjson))
+        if any("error" in r for r in results):
+            sys.exit(1)
+    elif args.command == "split":
+        asyncio.run(split_pool(args.count, int(args.amount * 1e8), args.confirm_within))
+    elif args.command == "bench":
+        bench(args.messages, args.pool, args.accept_delay)
     elif args.command == "read":
-        asyncio.run(read_messages(getattr(args, "address", None), getattr(args, "txid", None)))
+        asyncio.run(read_messages(args.address, args.txid, args.limit or None, args.since, args.ndjson))
+    elif args.command == "index":
+        asyncio.run(run_indexer(args.follow, args.concurrency))
     else:
         parser.print_help()
 
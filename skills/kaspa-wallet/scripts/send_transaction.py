@@ -4,10 +4,43 @@
 import argparse
 import asyncio
 import json
-from kaspa import (
-    RpcClient, Resolver, Generator, PaymentOutput,
-    Address, PrivateKey
-)
+from fees import MIN_FEERATE, FeeEstimator, compute_mass, fee_for, transaction_mass
+from ndjson import emit
+from spend_tracker import SpendTracker, outpoint
+from wallet_daemon import connect_daemon
+
+# Headroom over amount + estimated fee when picking inputs, so the change
+# output is not dust the generator cannot create
+FEE_MARGIN_SOMPI = 100_000
+RESERVE_ATTEMPTS = 10  # re-picks when another sender wins a race for the same inputs
+
+
+def reserve_inputs(tracker: SpendTracker, address: str, entries: list, amount_sompi: int,
+                   feerate: float = MIN_FEERATE) -> list:
+    """Pick and reserve inputs covering amount_sompi, the fee at feerate and FEE_MARGIN_SOMPI.
+
+    Outpoints other senders hold (reserved, or spent but not yet accepted)
+    are skipped; if another sender reserves a picked one first, re-read the
+    reservations and pick again.
+    """
+    listed = [outpoint(e) for e in entries]
+    for _ in range(RESERVE_ATTEMPTS):
+        held = tracker.reconcile(address, listed)
+        free = sorted((e for e in entries if outpoint(e) not in held),
+                      key=lambda e: e["utxoEntry"]["amount"], reverse=True)
+        picked, total = [], 0
+        for entry in free:
+            if picked and total >= amount_sompi + fee_for(compute_mass(len(picked), 2), feerate) + FEE_MARGIN_SOMPI:
+                break
+            picked.append(entry)
+            total += entry["utxoEntry"]["amount"]
+        if total < amount_sompi:
+            if held:
+                raise ValueError("Insufficient unreserved balance - other sends are still pending")
+            raise ValueError("Insufficient balance")
+        if not tracker.reserve([outpoint(e) for e in picked], address):
+            return picked
+    raise RuntimeError("Could not reserve inputs - too many concurrent sends")
 
 
 async def send_kas(
@@ -15,7 +48,9 @@ async def send_kas(
     private_key_hex: str,
     recipient_address: str,
     amount_kas: float,
-    network: str = "mainnet"
+    network: str = "mainnet",
+    client=None,
+    confirm_within: float | None = None,
 ) -> dict:
     """Send KAS to a recipient.
     
@@ -25,18 +60,42 @@ async def send_kas(
         recipient_address: Recipient's Kaspa address
         amount_kas: Amount to send in KAS
         network: "mainnet" or "testnet"
+        client: Connected RpcClient to use (left connected). Without one,
+            the wallet daemon sends it when running, else a direct
+            connection is opened for this call.
+        confirm_within: Target confirmation time in seconds; picks the
+            feerate from the node's fee estimate (default: normal bucket)
         
     Returns:
         dict with transaction info
     """
+    owned = client is None
+    if owned:
+        daemon = await connect_daemon(network)
+        if daemon is not None:
+            try:
+                return await daemon.request("/send", {
+                    "sender": sender_address, "private_key": private_key_hex,
+                    "recipient": recipient_address, "amount_kas": amount_kas, "network": network,
+                    "confirm_within": confirm_within,
+                })
+            finally:
+                await daemon.disconnect()
+
+    from kaspa import (
+        RpcClient, Resolver, Generator, PaymentOutput,
+        Address, PrivateKey
+    )
+
     amount_sompi = int(amount_kas * 100_000_000)
     
     private_key = PrivateKey(private_key_hex)
     sender = Address(sender_address)
     recipient = Address(recipient_address)
     
-    client = RpcClient(resolver=Resolver(), network_id=network)
-    await client.connect()
+    if owned:
+        client = RpcClient(resolver=Resolver(), network_id=network)
+        await client.connect()
     
     try:
         # Get UTXOs
@@ -47,32 +106,61 @@ async def send_kas(
         if not utxos["entries"]:
             raise ValueError("No UTXOs found - insufficient balance")
         
+        feerate = await FeeEstimator(client, network).feerate(confirm_within)
+        
+        # Reserve inputs no concurrent send (in any process) is spending. The
+        # tracker waits on SQLite's write lock, so it runs off the event loop
+        tracker = await asyncio.to_thread(SpendTracker)
+        try:
+            entries = await asyncio.to_thread(reserve_inputs, tracker, sender_address, utxos["entries"],
+                                              amount_sompi, feerate)
+        except BaseException:
+            tracker.close()
+            raise
+        keys = [outpoint(e) for e in entries]
+        
+        # The generator charges the minimum feerate; the rest is priority fee
+        amounts = [e["utxoEntry"]["amount"] for e in entries]
+        change = sum(amounts) - amount_sompi
+        mass = transaction_mass(amounts, [amount_sompi] + ([change] if change > 0 else []))
+        priority_fee = fee_for(mass, feerate) - fee_for(mass, MIN_FEERATE)
+        
         # Create transaction generator
         generator = Generator(
             network_id=network,
-            entries=utxos["entries"],
+            entries=entries,
             change_address=sender,
             outputs=[PaymentOutput(recipient, amount_sompi)],
             sig_op_count=1,
-            priority_fee=0,
+            priority_fee=priority_fee,
         )
         
         # Sign and submit
         tx_ids = []
-        for pending_tx in generator:
-            pending_tx.sign([private_key])
-            tx_id = await pending_tx.submit(client)
-            tx_ids.append(str(tx_id))
+        try:
+            for pending_tx in generator:
+                pending_tx.sign([private_key])
+                tx_id = await pending_tx.submit(client)
+                tx_ids.append(str(tx_id))
+        finally:
+            # Submitted inputs stay held until the node accepts the spend
+            if tx_ids:
+                await asyncio.to_thread(tracker.mark_spent, keys, tx_ids[-1])
+            else:
+                await asyncio.to_thread(tracker.release, keys)
+            tracker.close()
         
         return {
             "success": True,
             "tx_ids": tx_ids,
             "amount_kas": amount_kas,
             "recipient": recipient_address,
+            "feerate": feerate,
         }
         
     finally:
-        await client.disconnect()
+        if owned:
+            await client.disconnect()
 
 
 def main():
@@ -91,11 +179,21 @@ def main():
         default="mainnet",
         help="Network type (default: mainnet)"
     )
+    parser.add_argument(
+        "--confirm-within",
+        type=float,
+        help="Target confirmation time in seconds (feerate from the node's fee estimate)"
+    )
     parser.add_argument(
         "--json",
         action="store_true",
         help="Output as JSON"
     )
+    parser.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="Output as one compact JSON line"
+    )
     args = parser.parse_args()
     
     try:
@@ -104,20 +202,26 @@ def main():
             args.key,
             args.recipient,
             args.amount,
-            args.network
+            args.network,
+            confirm_within=args.confirm_within,
         ))
         
-        if args.json:
+        if args.ndjson:
+            emit(result)
+        elif args.json:
             print(json.dumps(result, indent=2))
         else:
             print("✅ Transaction submitted!")
             print(f"   Amount: {result['amount_kas']} KAS")
             print(f"   To: {result['recipient']}")
+            print(f"   Feerate: {result['feerate']:g} sompi/gram")
             for tx_id in result['tx_ids']:
                 print(f"   TX ID: {tx_id}")
                 
     except Exception as e:
-        if args.json:
+        if args.ndjson:
+            emit({"success": False, "error": str(e)})
+        elif args.json:
             print(json.dumps({"success": False, "error": str(e)}, indent=2))
         else:
             print(f"❌ Error: {e}")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Local pending-spend tracker shared by the sending scripts.
+
+get_utxos_by_addresses keeps listing an outpoint until the transaction
+spending it is accepted, so two sends started close together pick the same
+input and the later one is rejected as a double spend. Senders reserve the
+outpoints they are about to spend here first; reservations live in SQLite
+(PENDING_SPENDS_FILE), so senders in one process and across processes
+(send_message.py, send_transaction.py, the wallet daemon) get disjoint
+inputs.
+
+A reservation is released when the send fails, or after RESERVE_TTL if the
+process dies mid-send. Once submitted it is marked spent and dropped when
+the node stops listing the outpoint (accepted) or after SPEND_TIMEOUT
+(the transaction was dropped, so the outpoint is spendable again).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+
+PENDING_SPENDS_FILE = os.path.expanduser("~/.cache/kaspa-wallet/pending_spends.sqlite3")
+RESERVE_TTL = 60  # seconds a reservation may be held while building/submitting
+SPEND_TIMEOUT = 120  # seconds a submitted spend blocks its outpoints without being accepted
+LOCK_TIMEOUT = 30  # seconds to wait for another sender's write lock
+
+
+def outpoint(entry: dict) -> tuple:
+    """(transaction id, output index) of a get_utxos_by_addresses entry."""
+    op = entry["outpoint"]
+    return op["transactionId"], op["index"]
+
+
+class SpendTracker:
+    """Outpoint reservations in a SQLite database shared between processes.
+
+    Every mutation runs in a BEGIN IMMEDIATE transaction, which takes the
+    database write lock, so reserve() is an atomic check-and-insert across
+    processes. Use path=":memory:" for a tracker private to one process.
+
+    Waiting for that lock blocks the calling thread (up to LOCK_TIMEOUT), so
+    async senders call the tracker through asyncio.to_thread; a lock keeps
+    transactions from several threads off the shared connection at once.
+    """
+
+    def __init__(self, path: str = PENDING_SPENDS_FILE, reserve_ttl: float = RESERVE_TTL,
+                 spend_timeout: float = SPEND_TIMEOUT):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.reserve_ttl = reserve_ttl
+        self.spend_timeout = spend_timeout
+        self.owner = os.getpid()
+        self._lock = threading.Lock()
+        # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+        self.db = sqlite3.connect(path, timeout=LOCK_TIMEOUT, isolation_level=None, check_same_thread=False)
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS spends (
+                transaction_id TEXT NOT NULL,
+                output_index INTEGER NOT NULL,
+                address TEXT,
+                owner INTEGER NOT NULL,
+                spent_by TEXT,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (transaction_id, output_index)
+            )
+        """)
+
+    def _write(self):
+        return _Immediate(self.db, self._lock)
+
+    def reserve(self, keys: list, address: str | None = None) -> set:
+        """Reserve all of keys, or none of them.
+
+        Returns the keys already held by another sender (empty on success).
+        """
+        now = time.time()
+        with self._write():
+            self.db.execute("DELETE FROM spends WHERE expires_at < ?", (now,))
+            held = {
+                key for key in keys
+                if self.db.execute("SELECT 1 FROM spends WHERE transaction_id = ? AND output_index = ?", key).fetchone()
+            }
+            if not held:
+                self.db.executemany(
+                    "INSERT INTO spends VALUES (?, ?, ?, ?, NULL, ?)",
+                    [(tx_id, index, address, self.owner, now + self.reserve_ttl) for tx_id, index in keys],
+                )
+        return held
+
+    def release(self, keys: list):
+        """Give back reservations of a send that did not go out."""
+        with self._write():
+            self.db.executemany(
+                "DELETE FROM spends WHERE transaction_id = ? AND output_index = ? AND spent_by IS NULL",
+                keys,
+            )
+
+    def mark_spent(self, keys: list, tx_id: str):
+        """The send went out: hold the outpoints until the node accepts it."""
+        with self._write():
+            self.db.executemany(
+                "UPDATE spends SET spent_by = ?, expires_at = ? WHERE transaction_id = ? AND output_index = ?",
+                [(tx_id, time.time() + self.spend_timeout, t, i) for t, i in keys],
+            )
+
+    def reconcile(self, address: str, listed) -> set:
+        """Sync with a fresh UTXO listing of address; returns the held outpoints.
+
+        Spent outpoints the node no longer lists have been accepted and are
+        forgotten. What remains (reserved or spent, by anyone) must not be
+        selected.
+        """
+        listed = set(listed)
+        with self._write():
+            self.db.execute("DELETE FROM spends WHERE expires_at < ?", (time.time(),))
+            rows = self.db.execute(
+                "SELECT transaction_id, output_index, spent_by FROM spends WHERE address = ?", (address,)
+            ).fetchall()
+            accepted = [(t, i) for t, i, spent_by in rows if spent_by is not None and (t, i) not in listed]
+            self.db.executemany("DELETE FROM spends WHERE transaction_id = ? AND output_index = ?", accepted)
+        return {(t, i) for t, i, _ in rows} - set(accepted)
+
+    def close(self):
+        self.db.close()
+
+
+class _Immediate:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block, one thread at a time."""
+
+    def __init__(self, db, lock):
+        self.db = db
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def __exit__(self, exc_type, *_):
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Long-lived wallet daemon holding warm Kaspa RPC connections.
+
+The daemon keeps one connected RpcClient per (network, url) and serves
+HTTP on a Unix socket (DAEMON_SOCKET, mode 0600):
+
+    GET  /health  connections and request counters
+    POST /rpc     {"network", "url"?, "method", "params"} -> {"ok", "result"}
+    POST /send    send_transaction.send_kas arguments -> its result
+
+The wallet scripts call connect_rpc(), which returns a DaemonClient when
+the daemon is running and a directly connected RpcClient otherwise, so
+they skip the resolver lookup and websocket handshake per invocation.
+
+Usage: python3 wallet_daemon.py [--socket PATH]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+
+DAEMON_SOCKET = os.environ.get("KASPA_WALLET_SOCKET", os.path.expanduser("~/.cache/kaspa-wallet/daemon.sock"))
+RPC_TIMEOUT = 30  # seconds per call through the daemon
+# Node calls the daemon forwards; anything else is rejected. Only calls whose
+# params and results are plain JSON belong here: a signed SDK Transaction
+# cannot cross the socket, so sending goes through /send instead of
+# submit_transaction
+RPC_METHODS = {
+    "get_balance_by_address", "get_balances_by_addresses", "get_utxos_by_addresses",
+    "get_block", "get_blocks", "get_block_dag_info", "get_server_info", "get_info",
+    "get_fee_estimate", "get_mempool_entries_by_addresses",
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# Client side
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class DaemonClient:
+    """RpcClient stand-in that forwards calls to the daemon.
+
+    Methods mirror RpcClient (await client.get_utxos_by_addresses({...})),
+    so scripts use either one unchanged.
+    """
+
+    def __init__(self, network: str = "mainnet", url: str | None = None, socket_path: str = DAEMON_SOCKET):
+        import httpx
+
+        self.network = network
+        self.url = url
+        self._http = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=socket_path),
+            base_url="http://wallet-daemon", timeout=RPC_TIMEOUT,
+        )
+
+    async def request(self, path: str, body: dict) -> dict:
+        resp = await self._http.post(path, json=body)
+        data = resp.json()
+        if not data.get("ok"):
+            raise RuntimeError(data.get("error", f"daemon error {resp.status_code}"))
+        return data["result"]
+
+    async def ping(self) -> bool:
+        import httpx
+
+        try:
+            return (await self._http.get("/health")).status_code == 200
+        except httpx.TransportError:
+            return False
+
+    def __getattr__(self, method: str):
+        if method not in RPC_METHODS:
+            raise AttributeError(method)
+
+        async def call(request: dict | None = None, **kwargs):
+            params = request if request is not None else kwargs.get("request", {})
+            return await self.request("/rpc", {"network": self.network, "url": self.url,
+                                               "method": method, "params": params})
+        return call
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        await self._http.aclose()
+
+
+async def connect_daemon(network: str = "mainnet", url: str | None = None) -> DaemonClient | None:
+    """A DaemonClient if the daemon is up, else None."""
+    if not os.path.exists(DAEMON_SOCKET):
+        return None
+    client = DaemonClient(network, url)
+    if await client.ping():
+        return client
+    await client.disconnect()
+    return None
+
+
+async def connect_rpc(network: str = "mainnet", url: str | None = None):
+    """RPC client for the scripts: the daemon's warm connection when it is
+    running, otherwise a directly connected RpcClient (url, or the public
+    resolver when url is None)."""
+    client = await connect_daemon(network, url)
+    if client is not None:
+        return client
+    from kaspa import RpcClient, Resolver
+    if url:
+        client = RpcClient(resolver=None, url=url, network_id=network)
+    else:
+        client = RpcClient(resolver=Resolver(), network_id=network)
+    await client.connect()
+    return client
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# Daemon
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class WalletDaemon:
+    """Warm RpcClients on a background event loop, served over a Unix socket."""
+
+    def __init__(self, socket_path: str = DAEMON_SOCKET):
+        self.socket_path = socket_path
+        self.started_at = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.clients = {}
+        self._locks = {}
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True, name="wallet-daemon-loop").start()
+
+    def run(self, coro):
+        """Run a coroutine on the daemon loop from a handler thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(RPC_TIMEOUT)
+
+    async def client(self, network: str, url: str | None):
+        """Connected RpcClient for (network, url), connecting on first use."""
+        key = (network, url)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            client = self.clients.get(key)
+            if client is None or not getattr(client, "is_connected", True):
+                from kaspa import RpcClient, Resolver
+                if url:
+                    client = RpcClient(resolver=None, url=url, network_id=network)
+                else:
+                    client = RpcClient(resolver=Resolver(), network_id=network)
+                await client.connect()
+                self.clients[key] = client
+            return client
+
+    async def rpc(self, body: dict):
+        method = body.get("method")
+        if method not in RPC_METHODS:
+            raise ValueError(f"method not allowed: {method}")
+        network, url = body.get("network", "mainnet"), body.get("url")
+        for attempt in range(2):
+            client = await self.client(network, url)
+            try:
+                return await getattr(client, method)(request=body.get("params") or {})
+            except Exception:
+                # A dropped connection is retried once on a fresh client
+                if attempt or getattr(client, "is_connected", True):
+                    raise
+                self.clients.pop((network, url), None)
+
+    async def send(self, body: dict):
+        from send_transaction import send_kas
+        client = await self.client(body.get("network", "mainnet"), None)
+        return await send_kas(body["sender"], body["private_key"], body["recipient"],
+                              float(body["amount_kas"]), body.get("network", "mainnet"), client=client,
+                              confirm_within=body.get("confirm_within"))
+
+    def health(self) -> dict:
+        return {
+            "uptime": round(time.time() - self.started_at),
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections": [{"network": n, "url": u, "connected": getattr(c, "is_connected", True)}
+                            for (n, u), c in self.clients.items()],
+        }
+
+    def _make_handler(self):
+        from http.server import BaseHTTPRequestHandler
+
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def address_string(self):
+                return "unix"
+
+            def _reply(self, status: int, data: dict):
+                body = json.dumps(data, default=str).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._reply(200, {"ok": True, "result": daemon.health()})
+                else:
+                    self._reply(404, {"ok": False, "error": "not found"})
+
+            def do_POST(self):
+                handler = {"/rpc": daemon.rpc, "/send": daemon.send}.get(self.path)
+                if handler is None:
+                    self._reply(404, {"ok": False, "error": "not found"})
+                    return
+                daemon.requests += 1
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                    self._reply(200, {"ok": True, "result": daemon.run(handler(body))})
+                except Exception as e:
+                    daemon.errors += 1
+                    self._reply(200, {"ok": False, "error": str(e)})
+
+        return Handler
+
+    def serve_forever(self):
+        import socketserver
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        old_umask = os.umask(0o177)  # socket is created 0600: private keys pass through /send
+        try:
+            server = Server(self.socket_path, self._make_handler())
+        finally:
+            os.umask(old_umask)
+        print(json.dumps({"status": "ready", "socket": self.socket_path}), flush=True)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.unlink(self.socket_path)
+            for client in self.clients.values():
+                asyncio.run_coroutine_threadsafe(client.disconnect(), self._loop).result(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kaspa wallet daemon (warm RPC connections)")
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help=f"Unix socket path (default: {DAEMON_SOCKET})")
+    args = parser.parse_args()
+    # Handlers import sibling scripts (send_transaction) by module name
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # Exit through serve_forever's cleanup so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        WalletDaemon(args.socket).serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+
+
+if __name__ == "__main__":
+    main()